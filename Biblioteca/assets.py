@@ -0,0 +1,285 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+
+import click
+from flask import current_app, request, send_from_directory, url_for
+from flask.cli import with_appcontext
+
+
+# Arquivos gerados por "flask assets" ficam em static/dist, com o hash do
+# conteúdo no nome, e o manifesto liga o nome original ao gerado
+PASTA_GERADOS = "dist"
+MANIFESTO = "manifest.json"
+# Larguras (px) das variantes de imagem, para srcset
+LARGURAS_IMAGEM = (320, 640, 960, 1280)
+QUALIDADE_JPEG = 80
+QUALIDADE_WEBP = 75
+# Tipos que valem a pena comprimir; imagens já são comprimidas
+EXTENSOES_GZIP = (".css", ".js", ".svg", ".json", ".txt")
+UM_ANO = 365 * 24 * 3600
+
+
+def init_app(app):
+    app.extensions["assets"] = carregar_manifesto(app.static_folder)
+    app.url_defaults(_nome_com_hash)
+    app.view_functions["static"] = servir_estatico
+    app.jinja_env.globals["srcset"] = srcset
+
+
+def carregar_manifesto(pasta_static):
+    caminho = os.path.join(pasta_static, PASTA_GERADOS, MANIFESTO)
+    try:
+        with open(caminho, encoding="utf-8") as arquivo:
+            return json.load(arquivo)
+    except FileNotFoundError:
+        return {"arquivos": {}, "variantes": {}}
+
+
+# url_for('static', filename='css/bootstrap.min.css') aponta para a versão
+# gerada, quando ela existe
+def _nome_com_hash(endpoint, valores):
+    if endpoint != "static" or "filename" not in valores:
+        return
+    gerado = current_app.extensions["assets"]["arquivos"].get(valores["filename"])
+    if gerado:
+        valores["filename"] = gerado
+
+
+# Variantes de uma imagem no formato do atributo srcset ("url 320w, ...").
+# Vazio quando "flask assets" ainda não gerou as variantes
+def srcset(nome, formato="jpeg"):
+    variantes = current_app.extensions["assets"]["variantes"].get(nome, [])
+    return ", ".join(
+        f"{url_for('static', filename=variante['arquivo'])} {variante['largura']}w"
+        for variante in variantes
+        if variante["formato"] == formato
+    )
+
+
+# Serve a pasta static. Arquivos gerados (com hash no nome) nunca mudam e
+# são cacheados por um ano como immutable; se existir um .gz ao lado e o
+# navegador aceitar gzip, ele é enviado no lugar do original
+def servir_estatico(filename):
+    pasta = current_app.static_folder
+    gerado = filename.startswith(PASTA_GERADOS + "/")
+    max_age = UM_ANO if gerado else current_app.get_send_file_max_age(filename)
+
+    comprimido = filename + ".gz"
+    if "gzip" in request.accept_encodings and os.path.isfile(os.path.join(pasta, comprimido)):
+        tipo = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        resposta = send_from_directory(pasta, comprimido, mimetype=tipo, max_age=max_age)
+        resposta.headers["Content-Encoding"] = "gzip"
+    else:
+        resposta = send_from_directory(pasta, filename, max_age=max_age)
+    resposta.vary.add("Accept-Encoding")
+    if gerado:
+        resposta.cache_control.public = True
+        resposta.cache_control.immutable = True
+    return resposta
+
+
+def _hash(conteudo):
+    return hashlib.sha256(conteudo).hexdigest()[:12]
+
+
+def _com_hash(nome, conteudo, sufixo=""):
+    base, extensao = os.path.splitext(nome)
+    return f"{base}{sufixo}.{_hash(conteudo)}{extensao}"
+
+
+# Palavras que aparecem nos templates (atributos class, JavaScript...). Como
+# no PurgeCSS, uma classe é considerada usada se o nome dela aparece
+def _palavras_usadas(pasta_templates):
+    palavras = set()
+    for raiz, _, arquivos in os.walk(pasta_templates):
+        for nome in arquivos:
+            with open(os.path.join(raiz, nome), encoding="utf-8") as arquivo:
+                palavras.update(re.findall(r"[A-Za-z0-9_-]+", arquivo.read()))
+    return palavras
+
+
+# Remove o conteúdo de :not(...), :is(...) etc., onde a classe não precisa
+# estar presente no HTML para o seletor valer
+_PSEUDO_COM_ARGUMENTO = re.compile(r":(?:not|is|where|has)\((?:[^()]|\([^()]*\))*\)")
+_CLASSE_OU_ID = re.compile(r"[.#](-?[_A-Za-z][\w-]*)")
+
+
+def _seletor_usado(seletor, usadas):
+    seletor = _PSEUDO_COM_ARGUMENTO.sub("", seletor)
+    return all(nome in usadas for nome in _CLASSE_OU_ID.findall(seletor))
+
+
+def _dividir_seletores(prelude):
+    partes, atual, profundidade = [], [], 0
+    for caractere in prelude:
+        if caractere in "([":
+            profundidade += 1
+        elif caractere in ")]":
+            profundidade -= 1
+        if caractere == "," and profundidade == 0:
+            partes.append("".join(atual))
+            atual = []
+        else:
+            atual.append(caractere)
+    partes.append("".join(atual))
+    return [parte.strip() for parte in partes if parte.strip()]
+
+
+def _compactar(corpo):
+    return re.sub(r"\s*\n\s*", " ", corpo.strip())
+
+
+def _fim_do_bloco(css, inicio):
+    # Posição do "}" que fecha o bloco aberto em css[inicio - 1]
+    profundidade, i = 1, inicio
+    while profundidade:
+        caractere = css[i]
+        if caractere in "\"'":
+            i = css.index(caractere, i + 1)
+        elif css.startswith("/*", i):
+            i = css.index("*/", i) + 1
+        elif caractere == "{":
+            profundidade += 1
+        elif caractere == "}":
+            profundidade -= 1
+        i += 1
+    return i - 1
+
+
+# Remove do CSS as regras cujos seletores usam classes/ids que não aparecem
+# nos templates. @media e @supports são filtrados por dentro (e somem se
+# ficarem vazios); as outras at-rules (@font-face, @keyframes...) ficam
+def purgar_css(css, usadas):
+    saida = []
+    i = 0
+    while i < len(css):
+        if css[i].isspace():
+            i += 1
+            continue
+        if css.startswith("/*", i):
+            fim = css.index("*/", i) + 2
+            # Comentários de licença (/*! ... */) são mantidos
+            if css.startswith("/*!", i):
+                saida.append(css[i:fim])
+            i = fim
+            continue
+
+        abre = css.find("{", i)
+        ponto_virgula = css.find(";", i)
+        if css[i] == "@" and ponto_virgula != -1 and (abre == -1 or ponto_virgula < abre):
+            # @charset, @import...
+            saida.append(css[i:ponto_virgula + 1])
+            i = ponto_virgula + 1
+            continue
+        if abre == -1:
+            break
+
+        prelude = css[i:abre].strip()
+        fecha = _fim_do_bloco(css, abre + 1)
+        corpo = css[abre + 1:fecha]
+        i = fecha + 1
+
+        if prelude.startswith(("@media", "@supports", "@layer", "@container")):
+            interno = purgar_css(corpo, usadas)
+            if interno:
+                saida.append(f"{prelude}{{{interno}}}")
+        elif prelude.startswith("@"):
+            saida.append(f"{prelude}{{{_compactar(corpo)}}}")
+        else:
+            seletores = [seletor for seletor in _dividir_seletores(prelude) if _seletor_usado(seletor, usadas)]
+            if seletores:
+                saida.append(f"{','.join(seletores)}{{{_compactar(corpo)}}}")
+    return "\n".join(saida)
+
+
+def _variantes_imagem(caminho, nome, gravar):
+    try:
+        from PIL import Image
+    except ImportError:
+        click.echo("Pillow não instalado: imagens copiadas sem redimensionar (pip install Pillow).", err=True)
+        return None
+
+    from io import BytesIO
+
+    variantes = []
+    with Image.open(caminho) as original:
+        original = original.convert("RGB")
+        larguras = [largura for largura in LARGURAS_IMAGEM if largura < original.width] or [original.width]
+        for largura in larguras:
+            altura = round(original.height * largura / original.width)
+            reduzida = original.resize((largura, altura), Image.LANCZOS)
+            for formato, extensao, opcoes in (
+                ("jpeg", ".jpg", {"quality": QUALIDADE_JPEG, "optimize": True, "progressive": True}),
+                ("webp", ".webp", {"quality": QUALIDADE_WEBP, "method": 6}),
+            ):
+                buffer = BytesIO()
+                reduzida.save(buffer, formato.upper(), **opcoes)
+                conteudo = buffer.getvalue()
+                base = os.path.splitext(nome)[0] + extensao
+                arquivo = gravar(_com_hash(base, conteudo, f"-{largura}w"), conteudo)
+                variantes.append({"largura": largura, "formato": formato, "arquivo": arquivo})
+    return variantes
+
+
+@click.command("assets")
+@click.option("--sem-purga", is_flag=True, help="Não remove as regras de CSS não usadas.")
+@with_appcontext
+def gerar_assets(sem_purga):
+    """Gera os arquivos estáticos otimizados (hash no nome, .gz, imagens)."""
+    pasta_static = current_app.static_folder
+    destino = os.path.join(pasta_static, PASTA_GERADOS)
+    shutil.rmtree(destino, ignore_errors=True)
+    manifesto = {"arquivos": {}, "variantes": {}}
+    usadas = _palavras_usadas(os.path.join(current_app.root_path, current_app.template_folder))
+    tamanhos = {}
+
+    def gravar(nome, conteudo):
+        caminho = os.path.join(destino, nome)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        with open(caminho, "wb") as arquivo:
+            arquivo.write(conteudo)
+        if nome.endswith(EXTENSOES_GZIP):
+            # mtime=0 deixa o .gz igual a cada build
+            with open(caminho + ".gz", "wb") as arquivo:
+                arquivo.write(gzip.compress(conteudo, 9, mtime=0))
+        return f"{PASTA_GERADOS}/{nome}"
+
+    for raiz, pastas, arquivos in os.walk(pasta_static):
+        pastas[:] = [pasta for pasta in pastas if os.path.join(raiz, pasta) != destino]
+        for arquivo in sorted(arquivos):
+            caminho = os.path.join(raiz, arquivo)
+            nome = os.path.relpath(caminho, pasta_static).replace(os.sep, "/")
+            with open(caminho, "rb") as entrada:
+                conteudo = entrada.read()
+
+            if nome.endswith(".css") and not sem_purga:
+                conteudo = purgar_css(conteudo.decode("utf-8"), usadas).encode("utf-8")
+            elif nome.endswith((".jpg", ".jpeg")):
+                variantes = _variantes_imagem(caminho, nome, gravar)
+                if variantes:
+                    manifesto["variantes"][nome] = variantes
+                    # O nome original aponta para a maior variante JPEG
+                    maior = max((v for v in variantes if v["formato"] == "jpeg"), key=lambda v: v["largura"])
+                    manifesto["arquivos"][nome] = maior["arquivo"]
+                    tamanhos[nome] = (os.path.getsize(caminho), os.path.getsize(os.path.join(pasta_static, maior["arquivo"])))
+                    continue
+
+            gerado = gravar(_com_hash(nome, conteudo), conteudo)
+            manifesto["arquivos"][nome] = gerado
+            servido = os.path.join(pasta_static, gerado)
+            if os.path.exists(servido + ".gz"):
+                servido += ".gz"
+            tamanhos[nome] = (os.path.getsize(caminho), os.path.getsize(servido))
+
+    os.makedirs(destino, exist_ok=True)
+    with open(os.path.join(destino, MANIFESTO), "w", encoding="utf-8") as arquivo:
+        json.dump(manifesto, arquivo, indent=2, sort_keys=True)
+    current_app.extensions["assets"] = manifesto
+
+    for nome, (antes, depois) in sorted(tamanhos.items()):
+        click.echo(f"{nome}: {antes / 1024:.0f} KB -> {depois / 1024:.1f} KB")
@@ -0,0 +1,185 @@
+import os
+import re
+import sqlite3
+import tempfile
+from datetime import date, timedelta
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event
+
+from banco import inicializar_banco, requisicao_isolada
+from extensions import db
+
+
+# Rotas exercitadas pela auditoria. "listagem" marca as páginas que exibem a
+# tabela inteira ou a percorrem desde o início (a primeira página do acervo):
+# nelas a varredura da tabela principal é esperada, mas as tabelas ligadas
+# por JOIN continuam precisando de índice
+ROTAS_AUDITADAS = [
+    ("anonimo", "POST", "/", {"email": "{email}", "senha": "senha-incorreta"}, False),
+    ("funcionario", "GET", "/livros", None, True),
+    ("funcionario", "GET", "/livros?apos={livro_id}", None, False),
+    ("funcionario", "GET", "/livros?antes={livro_id}", None, False),
+    ("funcionario", "GET", "/buscar_livros?q=a", None, False),
+    ("funcionario", "GET", "/sugestoes/livros?q=a", None, False),
+    ("funcionario", "GET", "/sugestoes/alunos?q=a", None, False),
+    ("funcionario", "GET", "/livros_alugados", None, True),
+    ("funcionario", "GET", "/devolver", None, True),
+    ("funcionario", "GET", "/excluir_livro", None, True),
+    ("funcionario", "GET", "/relatorio?data_inicial={inicio}&data_final={fim}", None, False),
+    ("funcionario", "POST", "/alugar", {"livro_id": "{livro_id}", "aluno_id": "{aluno_id}"}, False),
+    ("funcionario", "POST", "/devolver", {"livro_alugado_id": "{aluguel_id}"}, False),
+    ("aluno", "GET", "/livros_alugados{nome_aluno}", None, False),
+]
+
+
+# Tabelas pequenas por construção, que podem ser varridas em qualquer rota:
+# versao_dados tem uma linha por grupo de dados e, com as estatísticas do
+# ANALYZE, o planejador prefere ler essas poucas linhas a usar a chave primária
+TABELAS_PEQUENAS = {"versao_dados"}
+# Nome da tabela num detalhe do plano ("SCAN alunos_1 USING INDEX ..."); o
+# SQLAlchemy dá aos aliases o nome da tabela com um número no fim
+_TABELA_NO_PLANO = re.compile(r"^(?:SCAN|SEARCH) (\w+?)(?:_\d+)?(?: |$)")
+
+
+# Linhas do EXPLAIN QUERY PLAN que leem uma tabela (ou um índice) inteira.
+# Uma varredura só é aceita no laço externo das rotas marcadas como listagem;
+# nas demais, inclusive as que usam LIMIT, a consulta tem que chegar às linhas
+# por um SEARCH, e dentro de um JOIN a varredura se repetiria para cada linha
+# do laço externo. Índices automáticos também contam como falta de índice
+def varreduras(plano, listagem):
+    problemas = []
+    externos = set()
+    for _, pai, _, detalhe in plano:
+        if not detalhe.startswith(("SCAN", "SEARCH")):
+            continue
+        externo = pai not in externos
+        externos.add(pai)
+        # Índice temporário que o SQLite monta a cada execução por falta de
+        # um índice declarado
+        if "AUTOMATIC" in detalhe:
+            problemas.append(f"{detalhe} (índice automático)")
+            continue
+        if not detalhe.startswith("SCAN") or "VIRTUAL TABLE" in detalhe or "CONSTANT ROW" in detalhe:
+            continue
+        tabela = _TABELA_NO_PLANO.match(detalhe)
+        if tabela and tabela.group(1) in TABELAS_PEQUENAS:
+            continue
+        if externo and listagem:
+            continue
+        problemas.append(detalhe if externo else f"{detalhe} (dentro de JOIN)")
+    return problemas
+
+
+# Cópia consistente do banco (API de backup do SQLite), para que as rotas
+# com escrita possam ser exercitadas sem alterar os dados reais
+def copiar_banco(origem, destino):
+    with sqlite3.connect(origem) as fonte, sqlite3.connect(destino) as copia:
+        fonte.backup(copia)
+
+
+# Ids e nomes usados para montar as URLs e formulários das rotas
+def valores_de_exemplo():
+    from models import Aluno, Funcionario, Livro
+
+    funcionario = Funcionario.query.first()
+    aluno = Aluno.query.filter(Aluno.qtdeLivros < 3).first()
+    livro = Livro.query.filter(Livro.qtdeLivDisponiveis > 0).first()
+    if funcionario is None or aluno is None or livro is None:
+        raise click.ClickException(
+            "O banco precisa de ao menos um funcionário, um aluno com vaga e um livro disponível (veja flask seed)."
+        )
+    return {
+        "funcionario": funcionario.user.id,
+        "aluno": aluno.user.id,
+        "email": funcionario.user.email,
+        "nome_aluno": aluno.user.name,
+        "aluno_id": aluno.id,
+        "livro_id": livro.idLivro,
+        "inicio": (date.today() - timedelta(days=30)).isoformat(),
+        "fim": date.today().isoformat(),
+    }
+
+
+@click.command("auditar-indices")
+@click.option("--detalhes", is_flag=True, help="Mostra o plano de todas as consultas.")
+@with_appcontext
+def auditar_indices(detalhes):
+    """Falha se alguma rota fizer varredura completa onde deveria usar índice."""
+    from app import create_app
+    from models import LivrosAlugados
+
+    if db.engine.dialect.name != "sqlite":
+        raise click.ClickException("A auditoria usa o EXPLAIN QUERY PLAN do SQLite.")
+
+    pasta = tempfile.mkdtemp(prefix="auditoria-")
+    copia = os.path.join(pasta, "auditoria.db")
+    copiar_banco(db.engine.url.database, copia)
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{copia}",
+        "FRAGMENT_CACHE": "nenhum",
+        "RATE_LIMIT_IP": "1000000/1",
+        "RATE_LIMIT_EMAIL": "1000000/1",
+    })
+    falhas = []
+
+    with app.app_context():
+        # A cópia recebe as tabelas e os índices dos modelos atuais
+        inicializar_banco()
+        valores = valores_de_exemplo()
+        cliente = app.test_client()
+        executadas = []
+
+        def registrar(conexao, cursor, comando, parametros, contexto, executemany):
+            if not executemany and comando.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "WITH")):
+                executadas.append((comando, parametros))
+
+        for papel, metodo, url, dados, listagem in ROTAS_AUDITADAS:
+            if "{aluguel_id}" in str(dados):
+                ultimo = db.session.query(db.func.max(LivrosAlugados.id)).scalar()
+                valores["aluguel_id"] = ultimo
+            url = url.format(**valores)
+            formulario = {campo: valor.format(**valores) for campo, valor in dados.items()} if dados else None
+
+            with cliente.session_transaction() as sessao:
+                sessao.clear()
+                if papel != "anonimo":
+                    sessao["_user_id"] = str(valores[papel])
+                    sessao["_fresh"] = True
+            app.extensions["cache_usuarios"].clear()
+
+            executadas.clear()
+            event.listen(db.engine, "before_cursor_execute", registrar)
+            try:
+                resposta = requisicao_isolada(cliente, metodo, url, data=formulario)
+            finally:
+                event.remove(db.engine, "before_cursor_execute", registrar)
+
+            click.echo(f"{metodo} {url} ({resposta.status_code})")
+            vistos = set()
+            with db.engine.connect() as conexao:
+                for comando, parametros in executadas:
+                    if comando in vistos:
+                        continue
+                    vistos.add(comando)
+                    plano = conexao.exec_driver_sql("EXPLAIN QUERY PLAN " + comando, parametros).all()
+                    problemas = varreduras(plano, listagem)
+                    resumo = " ".join(comando.split())[:100]
+                    if detalhes or problemas:
+                        click.echo(f"    {resumo}")
+                        for linha in plano:
+                            click.echo(f"      {linha[3]}")
+                    for problema in problemas:
+                        click.echo(f"    VARREDURA: {problema}")
+                        falhas.append(f"{metodo} {url}: {problema}")
+
+        db.session.remove()
+        db.engine.dispose()
+    for arquivo in os.listdir(pasta):
+        os.remove(os.path.join(pasta, arquivo))
+    os.rmdir(pasta)
+
+    if falhas:
+        raise click.ClickException(f"{len(falhas)} varredura(s) completa(s) em caminhos com índice esperado.")
+    click.echo("Nenhuma varredura completa fora das listagens.")
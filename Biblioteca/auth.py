@@ -0,0 +1,300 @@
+import csv
+import io
+from datetime import datetime, timedelta
+
+import click
+from flask import Blueprint, Response, current_app, flash, has_app_context, redirect, render_template, request, session, url_for
+from flask_login import current_user, login_required, login_user
+from sqlalchemy import event
+from sqlalchemy.orm import joinedload
+
+import importacao
+from cache import CacheTTL
+from extensions import db, login_manager, senhas
+from models import Aluno, Funcionario, TokenAtivacao, User
+from seguranca import HashIndisponivel, LimitadorTaxa
+
+
+bp = Blueprint("auth", __name__, cli_group=None)
+
+MENSAGEM_LIMITE = "Muitas tentativas. Aguarde um pouco e tente novamente."
+MENSAGEM_OCUPADO = "Servidor ocupado. Tente novamente em instantes."
+
+# Cache de usuários e limitadores de tentativas são do app (cada app criado
+# por create_app tem os seus)
+@bp.record_once
+def configurar(estado):
+    app = estado.app
+    app.extensions["cache_usuarios"] = CacheTTL(app.config["USER_CACHE_SIZE"], app.config["USER_CACHE_TTL"])
+    app.extensions["limitadores"] = {
+        "ip": LimitadorTaxa.de_texto(app.config["RATE_LIMIT_IP"]),
+        "email": LimitadorTaxa.de_texto(app.config["RATE_LIMIT_EMAIL"]),
+    }
+
+# Usuários carregados ficam num cache por processo, já com aluno/funcionário,
+# e são desligados da sessão do banco para poderem ser usados por outras
+# requisições. Qualquer alteração no usuário o remove do cache
+@login_manager.user_loader
+def load_user(user_id):
+    cache_usuarios = current_app.extensions["cache_usuarios"]
+    user = cache_usuarios.get(user_id)
+    if user is None:
+        user = User.query.options(joinedload(User.aluno), joinedload(User.funcionario)).get(user_id)
+        if user is not None:
+            db.session.expunge(user)
+            cache_usuarios.set(user_id, user)
+    return user
+
+def invalidar_usuario(user_id):
+    if has_app_context() and "cache_usuarios" in current_app.extensions:
+        current_app.extensions["cache_usuarios"].delete(str(user_id))
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _usuario_alterado(mapper, conexao, user):
+    invalidar_usuario(user.id)
+
+# Papel (aluno/funcionário) do usuário logado, guardado na sessão assinada
+# no login para não consultar funcionarios/alunos a cada requisição
+def salvar_papel(user):
+    session["papel"] = {
+        "usuario": user.get_id(),
+        "papel": "funcionario" if user.funcionario else "aluno" if user.aluno else None,
+        "aluno_id": user.aluno.id if user.aluno else None,
+    }
+
+def papel_atual():
+    if not current_user.is_authenticated:
+        return None
+    papel = session.get("papel")
+    # Sessões abertas antes do login gravar o papel, ou de outro usuário
+    if papel is None or papel.get("usuario") != current_user.get_id():
+        salvar_papel(current_user)
+        papel = session["papel"]
+    return papel
+
+def eh_funcionario():
+    papel = papel_atual()
+    return papel is not None and papel["papel"] == "funcionario"
+
+# Balde de tentativas do IP e do email nas rotas sem login
+def limite_excedido(email):
+    limitadores = current_app.extensions["limitadores"]
+    if not limitadores["ip"].permitir(request.remote_addr or "desconhecido"):
+        return True
+    return bool(email) and not limitadores["email"].permitir(email.strip().lower())
+
+# Login aluno
+@bp.route("/", methods=["GET", "POST"])
+def login():
+    if request.method == "POST":
+        email = request.form["email"]
+        password = request.form["senha"]
+
+        if limite_excedido(email):
+            flash(MENSAGEM_LIMITE)
+            return render_template("login.html"), 429
+
+        user = User.query.filter_by(email=email).first()
+        if not user:
+            flash("Usuário não encontrado")
+            return render_template("login.html")
+        if user.password == importacao.SENHA_NAO_DEFINIDA:
+            flash("Conta ainda não ativada. Use o link de ativação enviado pela biblioteca.")
+            return render_template("login.html")
+        try:
+            senha_correta = senhas.verificar(user.password, password)
+        except HashIndisponivel:
+            flash(MENSAGEM_OCUPADO)
+            return render_template("login.html"), 503
+        if not senha_correta:
+            flash("Usuário e senha INVÁLIDO")
+            return render_template("login.html")
+
+        # Refaz o hash quando o custo configurado mudou
+        if senhas.precisa_atualizar(user.password):
+            try:
+                user.password = senhas.gerar(password)
+                db.session.commit()
+            except HashIndisponivel:
+                db.session.rollback()
+        login_user(user)
+        salvar_papel(user)
+        if user.funcionario:
+            return redirect(url_for('auth.funcionario', nome_funcionario=user.name))
+        else:
+            return redirect(url_for('auth.alunos', nome_aluno=user.name))
+    return render_template("login.html")
+
+
+
+@bp.route("/alunos/<nome_aluno>")
+@login_required
+def alunos(nome_aluno):
+    return render_template("alunos.html", nome_aluno=nome_aluno)
+
+@bp.route("/funcionarios/<nome_funcionario>")
+@login_required
+def funcionario(nome_funcionario):
+    return render_template("funcionarios.html", nome_funcionario=nome_funcionario)
+
+#formulario register
+@bp.route("/registroaluno", methods=["GET", "POST"])
+def registroaluno():
+    if request.method == "POST":
+        if limite_excedido(request.form["inputEmail4"]):
+            flash(MENSAGEM_LIMITE)
+            return render_template("registroaluno.html"), 429
+        try:
+            hash_senha = senhas.gerar(request.form["inputPassword4"])
+        except HashIndisponivel:
+            flash(MENSAGEM_OCUPADO)
+            return render_template("registroaluno.html"), 503
+
+        user = User()
+        user.name = request.form["nome"]
+        user.email = request.form["inputEmail4"]
+        user.password = hash_senha
+        db.session.add(user)
+        db.session.commit()
+
+        aluno = Aluno()
+        aluno.endereco = request.form["endereco"]
+        aluno.telefone = request.form["telefone"]
+        aluno.numeroAluno = request.form["numero"]
+        aluno.qtdeLivros = 0 
+        aluno.pendencias = False
+        aluno.user = user
+        db.session.add(aluno)
+        db.session.commit()
+
+        return redirect(url_for('auth.login'))
+    return render_template("registroaluno.html")
+
+
+
+# Cadastro de alunos em lote a partir de uma lista (CSV). A resposta é um CSV
+# com o link de ativação de cada conta criada (ou ainda não ativada)
+@bp.route("/importar_alunos", methods=["GET", "POST"])
+@login_required
+def importar_alunos():
+    if not eh_funcionario():
+        flash("Acesso negado. Somente funcionários podem importar alunos.")
+        return redirect(url_for("auth.login"))
+
+    if request.method == "POST":
+        arquivo = request.files.get("arquivo")
+        if not arquivo or not arquivo.filename:
+            flash("Selecione um arquivo CSV.")
+            return redirect(url_for("auth.importar_alunos"))
+
+        saida = io.StringIO()
+        escritor = csv.writer(saida)
+        escritor.writerow(["nome", "email", "link_ativacao"])
+
+        def ao_criar(nome, email, token):
+            escritor.writerow([nome, email, url_for("auth.ativar_conta", token=token, _external=True)])
+
+        tamanho_lote = min(max(request.form.get("lote", importacao.TAMANHO_LOTE, type=int), 1), 10000)
+        delimitador = ";" if request.form.get("delimitador") == ";" else ","
+        texto = io.TextIOWrapper(arquivo.stream, encoding="utf-8-sig", newline="")
+        resultado = importacao.importar_alunos(
+            db, texto, tamanho_lote, delimitador, timedelta(days=current_app.config["ATIVACAO_VALIDADE_DIAS"]), ao_criar
+        )
+        if not resultado.inseridos and not resultado.reemitidos:
+            flash(f"Nenhum aluno cadastrado: {resultado}.")
+            return render_template("importar_alunos.html", resultado=resultado)
+        # Linhas recusadas (ou leitura interrompida) vão no fim do mesmo CSV;
+        # reenviar a lista corrigida gera links novos para quem ainda não ativou
+        for numero, erro in resultado.erros:
+            escritor.writerow(["erro", f"linha {numero}", erro])
+        return Response(
+            saida.getvalue(),
+            content_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": 'attachment; filename="ativacoes.csv"'},
+        )
+    return render_template("importar_alunos.html", resultado=None)
+
+@bp.cli.command("importar-alunos")
+@click.argument("caminho", type=click.Path(exists=True, dir_okay=False))
+@click.option("--saida", type=click.File("w", encoding="utf-8"), default="-", help="CSV com os links de ativação.")
+@click.option("--url-base", default="", help="Endereço do site, usado para montar os links.")
+@click.option("--lote", default=importacao.TAMANHO_LOTE, show_default=True, help="Alunos por executemany/commit.")
+@click.option("--delimitador", default=",", show_default=True)
+def importar_alunos_cli(caminho, saida, url_base, lote, delimitador):
+    """Cadastra os alunos de uma lista, cada um com um link de ativação."""
+    escritor = csv.writer(saida)
+    escritor.writerow(["nome", "email", "link_ativacao"])
+
+    def ao_criar(nome, email, token):
+        escritor.writerow([nome, email, url_base.rstrip("/") + f"/ativar/{token}"])
+
+    with open(caminho, encoding="utf-8-sig", newline="") as arquivo:
+        resultado = importacao.importar_alunos(
+            db, arquivo, lote, delimitador, timedelta(days=current_app.config["ATIVACAO_VALIDADE_DIAS"]), ao_criar
+        )
+    for numero, erro in resultado.erros:
+        click.echo(f"linha {numero}: {erro}", err=True)
+    click.echo(str(resultado), err=True)
+
+# Primeiro acesso do aluno cadastrado por lista: define a senha e invalida o token
+@bp.route("/ativar/<token>", methods=["GET", "POST"])
+def ativar_conta(token):
+    ativacao = TokenAtivacao.query.filter_by(token_hash=importacao.hash_token(token)).first()
+    if ativacao is None or ativacao.expira_em < datetime.utcnow():
+        flash("Link de ativação inválido ou expirado.")
+        return redirect(url_for("auth.login"))
+
+    if request.method == "POST":
+        senha = request.form["senha"]
+        if limite_excedido(None):
+            flash(MENSAGEM_LIMITE)
+            return render_template("ativar_conta.html", token=token), 429
+        if len(senha) < 6 or senha != request.form["confirmacao"]:
+            flash("As senhas devem ser iguais e ter pelo menos 6 caracteres.")
+            return render_template("ativar_conta.html", token=token)
+        try:
+            hash_senha = senhas.gerar(senha)
+        except HashIndisponivel:
+            flash(MENSAGEM_OCUPADO)
+            return render_template("ativar_conta.html", token=token), 503
+
+        user = db.session.get(User, ativacao.user_id)
+        user.password = hash_senha
+        db.session.delete(ativacao)
+        db.session.commit()
+        flash("Conta ativada. Faça o login com a nova senha.")
+        return redirect(url_for("auth.login"))
+    return render_template("ativar_conta.html", token=token)
+
+# Registro funcionário
+@bp.route("/registro_funcionario", methods=["GET", "POST"])
+def registrofuncionario():
+    if request.method == "POST":
+        if limite_excedido(request.form["inputEmail4"]):
+            flash(MENSAGEM_LIMITE)
+            return render_template("registro_funcionario.html"), 429
+        try:
+            hash_senha = senhas.gerar(request.form["inputPassword4"])
+        except HashIndisponivel:
+            flash(MENSAGEM_OCUPADO)
+            return render_template("registro_funcionario.html"), 503
+
+        user = User()
+        user.name = request.form["nome"]
+        user.email = request.form["inputEmail4"]
+        user.password = hash_senha
+        db.session.add(user)
+        db.session.commit()
+
+        funcionario = Funcionario()
+        funcionario.endereco = request.form["endereco"]
+        funcionario.telefone = request.form["telefone"]
+        funcionario.numeroFuncionario = request.form["numero"]
+        funcionario.user = user
+        db.session.add(funcionario)
+        db.session.commit()
+
+        return redirect(url_for('auth.login'))
+    return render_template("registro_funcionario.html")
+
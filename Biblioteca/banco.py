@@ -0,0 +1,151 @@
+from contextlib import contextmanager
+
+import click
+from flask import current_app, g
+from flask.cli import with_appcontext
+from sqlalchemy import event, inspect, text
+
+from extensions import db
+from models import Aluno, Funcionario
+from versoes import garantir_versoes
+
+
+# Cria as tabelas e os índices declarados nos modelos.
+# create_all não adiciona índices novos em tabelas que já existem, então
+# eles são criados um a um (checkfirst ignora os que já estão no banco)
+def inicializar_banco():
+    from migracoes import migrar_livros_alugados
+
+    db.create_all()
+    migrar_livros_alugados(db)
+    for tabela in db.metadata.sorted_tables:
+        for indice in tabela.indexes:
+            indice.create(db.engine, checkfirst=True)
+    criar_indice_busca()
+    garantir_versoes()
+
+# Índice invertido (SQLite FTS5) sobre título e editora. Os gatilhos mantêm o
+# índice em sincronia com qualquer escrita em livros, inclusive as feitas por
+# cadastrar_livro e excluir_livro
+def criar_indice_busca():
+    if db.engine.dialect.name != "sqlite":
+        return
+
+    novo = not inspect(db.engine).has_table("livros_busca")
+    with db.engine.begin() as conexao:
+        conexao.execute(text(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS livros_busca USING fts5('
+            '"tituloLivro", editora, content=livros, content_rowid="idLivro", '
+            "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        ))
+        conexao.execute(text(
+            'CREATE TRIGGER IF NOT EXISTS livros_busca_ai AFTER INSERT ON livros BEGIN '
+            'INSERT INTO livros_busca(rowid, "tituloLivro", editora) '
+            'VALUES (new."idLivro", new."tituloLivro", new.editora); END'
+        ))
+        conexao.execute(text(
+            'CREATE TRIGGER IF NOT EXISTS livros_busca_ad AFTER DELETE ON livros BEGIN '
+            'INSERT INTO livros_busca(livros_busca, rowid, "tituloLivro", editora) '
+            "VALUES ('delete', old.\"idLivro\", old.\"tituloLivro\", old.editora); END"
+        ))
+        conexao.execute(text(
+            'CREATE TRIGGER IF NOT EXISTS livros_busca_au AFTER UPDATE OF "tituloLivro", editora ON livros BEGIN '
+            'INSERT INTO livros_busca(livros_busca, rowid, "tituloLivro", editora) '
+            "VALUES ('delete', old.\"idLivro\", old.\"tituloLivro\", old.editora); "
+            'INSERT INTO livros_busca(rowid, "tituloLivro", editora) '
+            'VALUES (new."idLivro", new."tituloLivro", new.editora); END'
+        ))
+        if novo:
+            # Indexa os livros que já estavam cadastrados
+            conexao.execute(text("INSERT INTO livros_busca(livros_busca) VALUES ('rebuild')"))
+
+@click.command("init-db")
+@with_appcontext
+def init_db():
+    inicializar_banco()
+    print("Banco de dados inicializado.")
+
+# Registra os comandos SQL emitidos dentro do bloco
+@contextmanager
+def contar_consultas():
+    engine = db.engine
+    consultas = []
+
+    def registrar(conexao, cursor, comando, parametros, contexto, executemany):
+        consultas.append(comando)
+
+    event.listen(engine, "before_cursor_execute", registrar)
+    try:
+        yield consultas
+    finally:
+        event.remove(engine, "before_cursor_execute", registrar)
+
+# Requisição do cliente de teste a partir de um comando do CLI. O comando
+# roda dentro de um único contexto de aplicação, que as requisições do
+# cliente reaproveitam: descarta a sessão do banco e o usuário carregado
+# para cada requisição começar do zero
+def requisicao_isolada(cliente, metodo, url, **opcoes):
+    db.session.remove()
+    g.pop("_login_user", None)
+    return cliente.open(url, method=metodo, **opcoes)
+
+# Máximo de comandos SQL por página, independente do tamanho das tabelas
+ORCAMENTO_CONSULTAS = [
+    ("funcionario", "/livros", 3),
+    ("funcionario", "/livros_alugados", 3),
+    ("funcionario", "/alugar", 2),
+    ("funcionario", "/sugestoes/livros?q=a", 3),
+    ("funcionario", "/sugestoes/alunos?q=a", 3),
+    ("funcionario", "/devolver", 3),
+    ("aluno", "/livros_alugados{nome}", 3),
+]
+
+@click.command("verificar-consultas")
+@with_appcontext
+def verificar_consultas():
+    """Falha se alguma página emitir mais comandos SQL que o orçamento."""
+    falhas = []
+
+    # Listar alunos com o nome do usuário deve custar um único SELECT
+    with contar_consultas() as consultas:
+        nomes = [aluno.user.name for aluno in Aluno.query.limit(50).all()]
+    print(f"{len(consultas):3d}  listagem de {len(nomes)} alunos")
+    if len(consultas) > 1:
+        falhas.append("listagem de alunos")
+
+    funcionario = Funcionario.query.first()
+    aluno = Aluno.query.first()
+    usuarios = {
+        "funcionario": (funcionario.user.id, funcionario.user.name) if funcionario else None,
+        "aluno": (aluno.user.id, aluno.user.name) if aluno else None,
+    }
+
+    cliente = current_app.test_client()
+    for papel, url, limite in ORCAMENTO_CONSULTAS:
+        if usuarios[papel] is None:
+            print(f"  -  {url} (nenhum {papel} cadastrado)")
+            continue
+        id_usuario, nome = usuarios[papel]
+        with cliente.session_transaction() as sessao:
+            sessao["_user_id"] = str(id_usuario)
+            sessao["_fresh"] = True
+        url = url.format(nome=nome)
+
+        with contar_consultas() as consultas:
+            resposta = requisicao_isolada(cliente, "GET", url)
+        print(f"{len(consultas):3d}  {url} ({resposta.status_code}, limite {limite})")
+        if resposta.status_code != 200 or len(consultas) > limite:
+            falhas.append(url)
+
+        # Listagens com ETag: a revalidação só pode ler as versões dos dados
+        if resposta.headers.get("ETag"):
+            with contar_consultas() as consultas:
+                resposta = requisicao_isolada(cliente, "GET", url, headers={"If-None-Match": resposta.headers["ETag"]})
+            print(f"{len(consultas):3d}  {url} ({resposta.status_code}, revalidação, limite 1)")
+            if resposta.status_code != 304 or len(consultas) > 1:
+                falhas.append(f"{url} (revalidação)")
+
+    if falhas:
+        raise click.ClickException("Acima do orçamento de consultas: " + ", ".join(falhas))
+    print("Todas as páginas dentro do orçamento de consultas.")
+
@@ -0,0 +1,330 @@
+import hashlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+from time import perf_counter
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from auditoria import copiar_banco, valores_de_exemplo
+from banco import contar_consultas, inicializar_banco, requisicao_isolada
+from circulacao import LIMITE_LIVROS_ALUNO
+from extensions import db
+
+
+# Volumes dos bancos gerados para o benchmark (parâmetros de flask seed)
+TAMANHOS = {
+    "pequeno": {"livros": 1000, "alunos": 300, "funcionarios": 5, "historico": 20000, "abertos": 500, "dias": 365},
+    "medio": {"livros": 20000, "alunos": 5000, "funcionarios": 10, "historico": 200000, "abertos": 8000, "dias": 730},
+    "grande": {"livros": 100000, "alunos": 30000, "funcionarios": 20, "historico": 1000000, "abertos": 40000, "dias": 730},
+}
+
+# (nome, papel, método, url, formulário). Os formulários "aluguel" e
+# "devolucao" são gerados para cada repetição; as escritas vêm por último
+# para as leituras medirem o banco como foi gerado
+ROTAS_BENCHMARK = [
+    ("GET /livros", "funcionario", "GET", "/livros", None),
+    ("GET /livros?apos", "funcionario", "GET", "/livros?apos={livro_meio}", None),
+    ("GET /buscar_livros", "funcionario", "GET", "/buscar_livros?q=casa", None),
+    ("GET /sugestoes/livros", "funcionario", "GET", "/sugestoes/livros?q=fund", None),
+    ("GET /sugestoes/alunos", "funcionario", "GET", "/sugestoes/alunos?q=ma", None),
+    ("GET /livros_alugados", "funcionario", "GET", "/livros_alugados", None),
+    ("GET /livros_alugados<aluno>", "aluno", "GET", "/livros_alugados{nome_aluno}", None),
+    ("GET /devolver", "funcionario", "GET", "/devolver", None),
+    ("GET /relatorio", "funcionario", "GET", "/relatorio?data_inicial={inicio}&data_final={fim}", None),
+    ("GET /relatorio csv", "funcionario", "GET", "/relatorio?data_inicial={inicio}&data_final={fim}&formato=csv", None),
+    ("POST /alugar", "funcionario", "POST", "/alugar", "aluguel"),
+    ("POST /devolver", "funcionario", "POST", "/devolver", "devolucao"),
+]
+
+# Repetições medidas com tracemalloc ligado (ele deixa tudo mais lento, então
+# a latência é medida em repetições separadas)
+REPETICOES_MEMORIA = 3
+# Diferenças menores que essas são ruído, qualquer que seja a porcentagem
+MINIMO_MS = 0.2
+MINIMO_KB = 64
+METRICAS_LATENCIA = ("p50_ms", "p95_ms", "p99_ms")
+
+
+# Banco gerado para um tamanho, guardado em "pasta" e reaproveitado nas
+# próximas execuções. O nome inclui os parâmetros, então mudar TAMANHOS gera
+# um banco novo
+def banco_gerado(pasta, tamanho, semente):
+    from app import create_app
+    from dados_sinteticos import gerar_biblioteca
+
+    parametros = TAMANHOS[tamanho]
+    assinatura = hashlib.sha1(json.dumps([parametros, semente], sort_keys=True).encode()).hexdigest()[:8]
+    caminho = os.path.join(pasta, f"{tamanho}-{semente}-{assinatura}.db")
+    if os.path.exists(caminho):
+        return caminho
+
+    os.makedirs(pasta, exist_ok=True)
+    temporario = caminho + ".tmp"
+    if os.path.exists(temporario):
+        os.remove(temporario)
+    click.echo(f"Gerando o banco {tamanho} ({parametros})...")
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{temporario}"})
+    with app.app_context():
+        inicializar_banco()
+        hash_senha = app.extensions["hash_senhas"].gerar("senha123")
+        gerar_biblioteca(semente=semente, hash_senha=lambda: hash_senha, **parametros)
+        db.session.remove()
+        db.engine.dispose()
+    os.replace(temporario, caminho)
+    return caminho
+
+
+# Um formulário por repetição: aluguéis que vão dar certo (livro com cópia,
+# aluno com vaga) e devoluções dos aluguéis mais recentes
+def formularios(tipo, quantidade):
+    from models import Aluno, Livro, LivrosAlugados
+
+    if tipo == "devolucao":
+        ids = db.session.scalars(
+            db.select(LivrosAlugados.id).order_by(LivrosAlugados.id.desc()).limit(quantidade)
+        ).all()
+        return [{"livro_alugado_id": str(aluguel_id)} for aluguel_id in ids]
+
+    livros = db.session.scalars(
+        db.select(Livro.idLivro).where(Livro.qtdeLivDisponiveis > 0).order_by(Livro.idLivro).limit(quantidade)
+    ).all()
+    vagas = []
+    for aluno_id, qtde in db.session.execute(
+        db.select(Aluno.id, Aluno.qtdeLivros).where(Aluno.qtdeLivros < LIMITE_LIVROS_ALUNO).order_by(Aluno.id).limit(quantidade)
+    ):
+        vagas += [aluno_id] * (LIMITE_LIVROS_ALUNO - (qtde or 0))
+    return [{"livro_id": str(livro), "aluno_id": str(aluno)} for livro, aluno in zip(livros, vagas)]
+
+
+def percentil(ordenadas, fracao):
+    return ordenadas[min(len(ordenadas) - 1, round(fracao * (len(ordenadas) - 1)))]
+
+
+def _sucesso(metodo, resposta):
+    # As escritas redirecionam para a listagem quando dão certo e de volta
+    # para o formulário quando falham
+    if metodo == "POST":
+        return resposta.status_code == 302 and not resposta.location.endswith(("/alugar", "/devolver"))
+    return resposta.status_code == 200
+
+
+def medir_rota(app, cliente, papel, metodo, url, formulario, valores, repeticoes, aquecimento):
+    total = aquecimento + repeticoes + REPETICOES_MEMORIA
+    dados = formularios(formulario, total) if formulario else [None] * total
+    if len(dados) < total:
+        raise click.ClickException(f"{metodo} {url}: só há dados para {len(dados)} de {total} repetições.")
+
+    with cliente.session_transaction() as sessao:
+        sessao.clear()
+        sessao["_user_id"] = str(valores[papel])
+        sessao["_fresh"] = True
+    app.extensions["cache_usuarios"].clear()
+    url = url.format(**valores)
+
+    def requisitar(formulario):
+        resposta = requisicao_isolada(cliente, metodo, url, data=formulario)
+        # Lê o corpo inteiro, inclusive das respostas em streaming
+        resposta.get_data()
+        resposta.close()
+        return resposta
+
+    dados = iter(dados)
+    for _ in range(aquecimento):
+        requisitar(next(dados))
+
+    latencias = []
+    consultas = 0
+    erros = 0
+    for _ in range(repeticoes):
+        formulario = next(dados)
+        with contar_consultas() as comandos:
+            inicio = perf_counter()
+            resposta = requisitar(formulario)
+            latencias.append((perf_counter() - inicio) * 1000)
+        consultas = max(consultas, len(comandos))
+        erros += not _sucesso(metodo, resposta)
+
+    tracemalloc.start()
+    pico = 0
+    try:
+        for _ in range(REPETICOES_MEMORIA):
+            formulario = next(dados)
+            tracemalloc.reset_peak()
+            antes = tracemalloc.get_traced_memory()[0]
+            requisitar(formulario)
+            pico = max(pico, tracemalloc.get_traced_memory()[1] - antes)
+    finally:
+        tracemalloc.stop()
+
+    ordenadas = sorted(latencias)
+    return {
+        "repeticoes": repeticoes,
+        "media_ms": round(statistics.fmean(latencias), 3),
+        "p50_ms": round(percentil(ordenadas, 0.50), 3),
+        "p90_ms": round(percentil(ordenadas, 0.90), 3),
+        "p95_ms": round(percentil(ordenadas, 0.95), 3),
+        "p99_ms": round(percentil(ordenadas, 0.99), 3),
+        "max_ms": round(ordenadas[-1], 3),
+        "consultas": consultas,
+        "pico_memoria_kb": round(pico / 1024, 1),
+        "erros": erros,
+    }
+
+
+# Mede todas as rotas numa cópia do banco gerado, para as escritas não
+# alterarem o banco guardado
+def medir_tamanho(caminho, repeticoes, aquecimento, cache_fragmentos, filtro):
+    from app import create_app
+    from models import Livro, LivrosAlugados
+
+    pasta = tempfile.mkdtemp(prefix="benchmark-")
+    copia = os.path.join(pasta, "benchmark.db")
+    copiar_banco(caminho, copia)
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{copia}",
+        "FRAGMENT_CACHE": cache_fragmentos,
+        "RATE_LIMIT_IP": "1000000/1",
+        "RATE_LIMIT_EMAIL": "1000000/1",
+    })
+    resultados = {}
+    try:
+        with app.app_context():
+            valores = valores_de_exemplo()
+            # Período do relatório relativo aos dados gerados, não à data de hoje
+            fim = db.session.scalar(db.select(db.func.max(LivrosAlugados.dataAluguel)))
+            valores["inicio"] = (fim - timedelta(days=30)).isoformat()
+            valores["fim"] = fim.isoformat()
+            valores["livro_meio"] = db.session.scalar(db.select(db.func.max(Livro.idLivro))) // 2
+            cliente = app.test_client()
+            for nome, papel, metodo, url, formulario in ROTAS_BENCHMARK:
+                if filtro and not any(parte in nome for parte in filtro):
+                    continue
+                resultados[nome] = medir_rota(app, cliente, papel, metodo, url, formulario, valores, repeticoes, aquecimento)
+                r = resultados[nome]
+                click.echo(
+                    f"  {nome:30} p50 {r['p50_ms']:8.2f}  p95 {r['p95_ms']:8.2f}  p99 {r['p99_ms']:8.2f} ms"
+                    f"  {r['consultas']:2d} consultas  {r['pico_memoria_kb']:9.1f} KB"
+                    + (f"  {r['erros']} ERROS" if r["erros"] else "")
+                )
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+    return resultados
+
+
+@click.command("benchmark")
+@click.option("--tamanhos", default="pequeno,medio", show_default=True, help=f"Entre {', '.join(TAMANHOS)}.")
+@click.option("--repeticoes", default=50, show_default=True, help="Requisições medidas por rota.")
+@click.option("--aquecimento", default=5, show_default=True, help="Requisições descartadas antes da medição.")
+@click.option("--semente", default=42, show_default=True)
+# Sem cache de trechos por padrão: com ele, depois do aquecimento as listagens
+# respondem do cache e nem a consulta nem o template da tabela são medidos
+@click.option(
+    "--cache-fragmentos", default="nenhum", show_default=True, type=click.Choice(["memoria", "disco", "nenhum"]),
+    help="Cache das tabelas renderizadas durante a medição.",
+)
+@click.option("--rota", "rotas", multiple=True, help="Mede só as rotas cujo nome contém este texto (pode repetir).")
+@click.option("--pasta", type=click.Path(file_okay=False), help="Onde guardar os bancos gerados (padrão: instance/benchmark).")
+@click.option("--saida", type=click.Path(dir_okay=False, writable=True), help="Grava os resultados neste JSON (baseline).")
+@with_appcontext
+def benchmark(tamanhos, repeticoes, aquecimento, semente, cache_fragmentos, rotas, pasta, saida):
+    """Mede latência, consultas e memória das rotas em bancos de vários tamanhos."""
+    tamanhos = [tamanho.strip() for tamanho in tamanhos.split(",") if tamanho.strip()]
+    desconhecidos = set(tamanhos) - set(TAMANHOS)
+    if desconhecidos:
+        raise click.BadParameter(f"tamanhos desconhecidos: {', '.join(sorted(desconhecidos))}", param_hint="--tamanhos")
+    if repeticoes < 2:
+        raise click.BadParameter("use ao menos 2 repetições.", param_hint="--repeticoes")
+    pasta = pasta or os.path.join(current_app.instance_path, "benchmark")
+
+    relatorio = {
+        "criado_em": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "repeticoes": repeticoes,
+        "aquecimento": aquecimento,
+        "semente": semente,
+        "cache_fragmentos": cache_fragmentos,
+        "tamanhos": {},
+    }
+    for tamanho in tamanhos:
+        caminho = banco_gerado(pasta, tamanho, semente)
+        click.echo(f"{tamanho}:")
+        relatorio["tamanhos"][tamanho] = {
+            "parametros": TAMANHOS[tamanho],
+            "rotas": medir_tamanho(caminho, repeticoes, aquecimento, cache_fragmentos, rotas),
+        }
+
+    if saida:
+        with open(saida, "w", encoding="utf-8") as arquivo:
+            json.dump(relatorio, arquivo, indent=2, ensure_ascii=False)
+        click.echo(f"Resultados gravados em {saida}.")
+    erros = sum(r["erros"] for t in relatorio["tamanhos"].values() for r in t["rotas"].values())
+    if erros:
+        raise click.ClickException(f"{erros} requisição(ões) não tiveram o resultado esperado.")
+
+
+def _variacao(base, atual):
+    return (atual - base) / base * 100 if base else (0.0 if atual == base else float("inf"))
+
+
+# Compara uma métrica: latência e memória regridem quando passam do limite
+# percentual e do mínimo absoluto; consultas, com qualquer aumento
+def comparar_metrica(metrica, base, atual, limite):
+    if metrica == "consultas":
+        return atual > base
+    minimo = MINIMO_KB if metrica == "pico_memoria_kb" else MINIMO_MS
+    return atual - base > minimo and _variacao(base, atual) > limite
+
+
+@click.command("comparar-benchmark")
+@click.argument("base", type=click.File(encoding="utf-8"))
+@click.argument("atual", type=click.File(encoding="utf-8"))
+@click.option("--limite", default=20.0, show_default=True, help="Piora máxima aceita, em %, de latência e memória.")
+@click.option("--memoria/--sem-memoria", default=True, show_default=True, help="Compara também o pico de memória.")
+def comparar_benchmark(base, atual, limite, memoria):
+    """Compara dois resultados do benchmark e falha se houver regressão."""
+    base, atual = json.load(base), json.load(atual)
+    metricas = METRICAS_LATENCIA + ("consultas",) + (("pico_memoria_kb",) if memoria else ())
+    regressoes = []
+    if base.get("cache_fragmentos") != atual.get("cache_fragmentos"):
+        click.echo(
+            f"Cache de trechos diferente ({base.get('cache_fragmentos')} -> {atual.get('cache_fragmentos')}): "
+            "as listagens não são comparáveis.",
+            err=True,
+        )
+
+    for tamanho, medido in atual["tamanhos"].items():
+        anterior = base["tamanhos"].get(tamanho)
+        if anterior is None:
+            click.echo(f"{tamanho}: sem baseline, ignorado.")
+            continue
+        if anterior["parametros"] != medido["parametros"]:
+            click.echo(f"{tamanho}: bancos com parâmetros diferentes, comparação aproximada.", err=True)
+        click.echo(f"{tamanho}:")
+        for nome, resultado in medido["rotas"].items():
+            referencia = anterior["rotas"].get(nome)
+            if referencia is None:
+                click.echo(f"  {nome:30} (rota nova)")
+                continue
+            partes = []
+            for metrica in metricas:
+                antes, depois = referencia[metrica], resultado[metrica]
+                piorou = comparar_metrica(metrica, antes, depois, limite)
+                partes.append(f"{metrica} {antes:g} -> {depois:g} ({_variacao(antes, depois):+.0f}%)" + (" REGRESSÃO" if piorou else ""))
+                if piorou:
+                    regressoes.append(f"{tamanho} {nome} {metrica}")
+            click.echo(f"  {nome:30} " + ", ".join(partes))
+
+    if regressoes:
+        raise click.ClickException(f"{len(regressoes)} regressão(ões): " + "; ".join(regressoes))
+    click.echo(f"Nenhuma regressão acima de {limite:g}%.")
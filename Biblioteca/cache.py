@@ -0,0 +1,42 @@
+import threading
+from collections import OrderedDict
+from time import monotonic
+
+
+# Cache LRU em memória com expiração por tempo. Vale só para o processo
+# atual; cada worker tem o seu
+class CacheTTL:
+    def __init__(self, tamanho_maximo=1024, ttl=60):
+        self.tamanho_maximo = tamanho_maximo
+        self.ttl = ttl
+        self.itens = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, chave):
+        with self.lock:
+            item = self.itens.get(chave)
+            if item is None:
+                return None
+            valor, expira_em = item
+            if expira_em < monotonic():
+                del self.itens[chave]
+                return None
+            self.itens.move_to_end(chave)
+            return valor
+
+    def set(self, chave, valor):
+        if self.tamanho_maximo <= 0 or self.ttl <= 0:
+            return
+        with self.lock:
+            self.itens[chave] = (valor, monotonic() + self.ttl)
+            self.itens.move_to_end(chave)
+            while len(self.itens) > self.tamanho_maximo:
+                self.itens.popitem(last=False)
+
+    def delete(self, chave):
+        with self.lock:
+            self.itens.pop(chave, None)
+
+    def clear(self):
+        with self.lock:
+            self.itens.clear()
@@ -0,0 +1,210 @@
+import io
+import re
+
+import click
+from flask import Blueprint, flash, jsonify, redirect, render_template, request, url_for
+from flask_login import login_required
+from sqlalchemy import or_, text
+
+import importacao
+from auth import eh_funcionario
+from fragmentos import fragmento
+from extensions import db
+from models import Livro
+from versoes import condicional, incrementar_versao
+
+
+bp = Blueprint("catalogo", __name__, cli_group=None)
+
+LIVROS_POR_PAGINA = 50
+LIVROS_POR_PAGINA_MAX = 200
+LIMITE_BUSCA = 50
+LIMITE_SUGESTOES = 10
+
+# Cadastrar Livro
+@bp.route("/cadastrar_livro", methods=["GET", "POST"])
+@login_required
+def cadastrar_livro():
+    if not eh_funcionario():
+        flash("Acesso negado. Somente funcionários podem cadastrar livros.")
+        return redirect(url_for("auth.login"))  # Redireciona para a página inicial ou outra página apropriada
+
+    if request.method == "POST":
+        titulo = request.form["tituloLivro"]
+        editora = request.form["editora"]
+        ano = request.form["anoLivro"]  # Corrigido para 'anoLivro'
+        quantidade = request.form["quantidade"]
+        qtde_disponiveis = request.form['qtdeLivDisponiveis']
+
+      # Crie e salve o objeto Livro com os valores fornecidos
+        livro = Livro(tituloLivro=titulo, editora=editora, anoLivro=ano, quantidadeLivros=quantidade, qtdeLivDisponiveis=qtde_disponiveis)
+        db.session.add(livro)
+        incrementar_versao("livros")
+        db.session.commit()
+
+        flash("Livro cadastrado com sucesso!")
+        return redirect(url_for("catalogo.livros"))
+
+
+    return render_template("cadastrar_livro.html")
+
+# Importação de livros em lote a partir de um CSV
+@bp.route("/importar_livros", methods=["GET", "POST"])
+@login_required
+def importar_livros():
+    if not eh_funcionario():
+        flash("Acesso negado. Somente funcionários podem importar livros.")
+        return redirect(url_for("auth.login"))
+
+    resultado = None
+    if request.method == "POST":
+        arquivo = request.files.get("arquivo")
+        if not arquivo or not arquivo.filename:
+            flash("Selecione um arquivo CSV.")
+            return redirect(url_for("catalogo.importar_livros"))
+
+        tamanho_lote = min(max(request.form.get("lote", importacao.TAMANHO_LOTE, type=int), 1), 10000)
+        delimitador = ";" if request.form.get("delimitador") == ";" else ","
+        texto = io.TextIOWrapper(arquivo.stream, encoding="utf-8-sig", newline="")
+        resultado = importacao.importar_livros(db, texto, tamanho_lote, delimitador)
+        flash(f"Importação concluída: {resultado}.")
+    return render_template("importar_livros.html", resultado=resultado)
+
+@bp.cli.command("importar-livros")
+@click.argument("caminho", type=click.Path(exists=True, dir_okay=False))
+@click.option("--lote", default=importacao.TAMANHO_LOTE, show_default=True, help="Livros por executemany/commit.")
+@click.option("--delimitador", default=",", show_default=True)
+def importar_livros_cli(caminho, lote, delimitador):
+    """Importa livros de um CSV, somando as quantidades dos que já existem."""
+    with open(caminho, encoding="utf-8-sig", newline="") as arquivo:
+        resultado = importacao.importar_livros(db, arquivo, lote, delimitador)
+    for numero, erro in resultado.erros:
+        print(f"linha {numero}: {erro}")
+    print(resultado)
+
+@bp.route("/excluir_livro", methods=["GET", "POST"])
+@login_required
+def excluir_livro():
+    if not eh_funcionario():
+        flash("Acesso negado. Somente funcionários podem excluir livros.")
+        return redirect(url_for("auth.login"))
+
+    livros = Livro.query.all()
+    
+    if request.method == "POST":
+        livro_id = request.form.get("livro_id")
+        livro = Livro.query.get(livro_id)
+
+        if livro:
+            db.session.delete(livro)
+            incrementar_versao("livros", "alugueis")
+            db.session.commit()
+            flash("Livro excluído com sucesso!")
+        else:
+            flash("Livro não encontrado.")
+
+        return redirect(url_for("catalogo.livros"))
+
+    livros = Livro.query.all()
+    return render_template("excluir_livro.html", livros=livros)
+
+# Exibe página com todos os livros cadastrados
+@bp.route("/livros")
+@login_required
+@condicional("livros")
+def livros():
+    # Paginação por cursor (keyset) em idLivro: "apos" avança e "antes" volta,
+    # sempre lendo no máximo uma página pelo índice da chave primária
+    por_pagina = min(max(request.args.get("por_pagina", LIVROS_POR_PAGINA, type=int), 1), LIVROS_POR_PAGINA_MAX)
+    apos = request.args.get("apos", type=int)
+    antes = request.args.get("antes", type=int)
+
+    # A tabela renderizada fica no cache de trechos enquanto o catálogo não muda
+    tabela = fragmento(
+        "livros", ("livros",), (apos, antes, por_pagina),
+        lambda: render_template("_tabela_livros.html", **pagina_de_livros(apos, antes, por_pagina)),
+    )
+    return render_template("livros.html", tabela=tabela)
+
+def pagina_de_livros(apos, antes, por_pagina):
+    consulta = Livro.query
+    if antes is not None:
+        consulta = consulta.filter(Livro.idLivro < antes).order_by(Livro.idLivro.desc())
+    else:
+        if apos is not None:
+            consulta = consulta.filter(Livro.idLivro > apos)
+        consulta = consulta.order_by(Livro.idLivro)
+
+    # Uma linha a mais indica se existe outra página na mesma direção
+    livros = consulta.limit(por_pagina + 1).all()
+    tem_mais = len(livros) > por_pagina
+    livros = livros[:por_pagina]
+    if antes is not None:
+        livros.reverse()
+
+    proxima = anterior = None
+    if livros:
+        if tem_mais or antes is not None:
+            proxima = livros[-1].idLivro
+        if (tem_mais and antes is not None) or apos is not None:
+            anterior = livros[0].idLivro
+    return {"livros": livros, "por_pagina": por_pagina, "proxima": proxima, "anterior": anterior}
+    
+# Busca de livros por título e editora
+@bp.route("/buscar_livros")
+@login_required
+@condicional("livros")
+def buscar_livros():
+    termo = request.args.get("q", "").strip()
+    livros = buscar_no_catalogo(termo) if termo else []
+    return render_template("buscar_livros.html", termo=termo, livros=livros)
+
+def buscar_no_catalogo(termo, limite=LIMITE_BUSCA):
+    palavras = re.findall(r"\w+", termo)
+    if not palavras:
+        return []
+
+    if db.engine.dialect.name != "sqlite":
+        consulta = Livro.query
+        for palavra in palavras:
+            padrao = f"%{palavra}%"
+            consulta = consulta.filter(or_(Livro.tituloLivro.ilike(padrao), Livro.editora.ilike(padrao)))
+        return consulta.order_by(Livro.tituloLivro).limit(limite).all()
+
+    # Cada palavra vira um prefixo obrigatório no índice FTS5; o título pesa
+    # mais que a editora no ranking bm25
+    expressao = " ".join(f'"{palavra}"*' for palavra in palavras)
+    return Livro.query.from_statement(text(
+        'SELECT livros.* FROM livros_busca JOIN livros ON livros."idLivro" = livros_busca.rowid '
+        'WHERE livros_busca MATCH :expressao ORDER BY bm25(livros_busca, 10.0, 1.0) LIMIT :limite'
+    ).bindparams(expressao=expressao, limite=limite)).all()
+
+# Filtro "começa com" que aproveita os índices NOCASE no SQLite. O padrão é
+# montado aqui (e não com startswith, que concatena '%' no SQL) para que o
+# SQLite reconheça o prefixo constante e faça uma busca por faixa no índice
+def filtro_prefixo(coluna, termo):
+    padrao = termo.replace("/", "//").replace("%", "/%").replace("_", "/_") + "%"
+    if db.engine.dialect.name == "sqlite":
+        return coluna.like(padrao, escape="/"), coluna.collate("NOCASE")
+    return coluna.ilike(padrao, escape="/"), coluna
+
+# Sugestões para o formulário de aluguel, buscadas enquanto o funcionário digita
+@bp.route("/sugestoes/livros")
+@login_required
+def sugestoes_livros():
+    if not eh_funcionario():
+        return jsonify(erro="Acesso negado."), 403
+
+    termo = request.args.get("q", "").strip()
+    if not termo:
+        return jsonify([])
+
+    filtro, ordem = filtro_prefixo(Livro.tituloLivro, termo)
+    livros = db.session.query(Livro.idLivro, Livro.tituloLivro, Livro.qtdeLivDisponiveis).filter(
+        filtro, Livro.qtdeLivDisponiveis > 0
+    ).order_by(ordem).limit(LIMITE_SUGESTOES).all()
+    return jsonify([
+        {"id": livro.idLivro, "titulo": livro.tituloLivro, "disponiveis": livro.qtdeLivDisponiveis}
+        for livro in livros
+    ])
+
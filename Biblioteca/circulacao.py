@@ -0,0 +1,225 @@
+from datetime import date, timedelta
+
+from flask import Blueprint, flash, jsonify, redirect, render_template, request, url_for
+from flask_login import login_required
+from sqlalchemy import delete, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from auth import eh_funcionario, papel_atual
+from catalogo import LIMITE_SUGESTOES, filtro_prefixo
+from extensions import db
+from fragmentos import fragmento
+from models import Aluno, CirculacaoAluno, CirculacaoLivro, Livro, LivrosAlugados, User
+from versoes import condicional, incrementar_versao
+
+
+bp = Blueprint("circulacao", __name__)
+
+LIMITE_LIVROS_ALUNO = 3
+PRAZO_DEVOLUCAO_DIAS = 30
+
+# Aluguéis com título do livro e nome do aluno resolvidos num único JOIN,
+# trazendo só as colunas que as tabelas das páginas exibem
+def consulta_alugueis():
+    return db.session.query(
+        LivrosAlugados.id,
+        LivrosAlugados.livro_id,
+        LivrosAlugados.aluno_id,
+        LivrosAlugados.dataAluguel,
+        LivrosAlugados.dataDevolucao,
+        Livro.tituloLivro,
+        User.name.label("nomeAluno"),
+    ).join(Livro, Livro.idLivro == LivrosAlugados.livro_id
+    ).join(Aluno, Aluno.id == LivrosAlugados.aluno_id
+    ).join(User, User.id == Aluno.user_id)
+
+
+# Soma empréstimos/devoluções nos totais do dia do livro e do aluno, dentro
+# da transação corrente (upsert no SQLite e no PostgreSQL)
+def registrar_circulacao(dia, livro_id, aluno_id, emprestimos=0, devolucoes=0):
+    for modelo, coluna, valor in (
+        (CirculacaoLivro, "livro_id", livro_id),
+        (CirculacaoAluno, "aluno_id", aluno_id),
+    ):
+        valores = {"dia": dia, coluna: valor, "emprestimos": emprestimos, "devolucoes": devolucoes}
+        incremento = {
+            "emprestimos": modelo.emprestimos + emprestimos,
+            "devolucoes": modelo.devolucoes + devolucoes,
+        }
+        dialeto = db.engine.dialect.name
+        if dialeto in ("sqlite", "postgresql"):
+            if dialeto == "sqlite":
+                inserir = sqlite_insert
+            else:
+                # Só é importado quando o banco é PostgreSQL
+                from sqlalchemy.dialects.postgresql import insert as inserir
+            db.session.execute(
+                inserir(modelo).values(**valores).on_conflict_do_update(index_elements=["dia", coluna], set_=incremento)
+            )
+        else:
+            atualizado = db.session.execute(
+                update(modelo)
+                .where(modelo.dia == dia, getattr(modelo, coluna) == valor)
+                .values(**incremento)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if not atualizado:
+                db.session.add(modelo(**valores))
+
+@bp.route("/livros_alugados<nome_aluno>")
+@login_required
+@condicional("alugueis")
+def alugados(nome_aluno):
+    aluno_id = papel_atual()["aluno_id"]
+    if aluno_id is None:
+        flash("Acesso negado. Somente alunos possuem livros alugados.")
+        return redirect(url_for("auth.login"))
+
+    # Busca só os aluguéis do aluno logado pelo índice de aluno_id
+    tabela = fragmento("alugueis_aluno", ("alugueis",), (aluno_id,), lambda: render_template(
+        "_tabela_alugueis_aluno.html",
+        livros_alugados=consulta_alugueis().filter(LivrosAlugados.aluno_id == aluno_id).order_by(LivrosAlugados.id).all(),
+    ))
+    return render_template("alunos_alugados.html", nome_aluno=nome_aluno, tabela=tabela)
+
+
+@bp.route("/livros_alugados")
+@login_required
+@condicional("alugueis")
+def livros_alugados():
+    tabela = fragmento("alugueis", ("alugueis",), (), lambda: render_template(
+        "_tabela_alugueis.html", livros_alugados=consulta_alugueis().order_by(LivrosAlugados.id).all()
+    ))
+    return render_template("livros_alugados.html", tabela=tabela)
+
+@bp.route("/alugar", methods=["GET", "POST"])
+@login_required
+def alugar():
+    if not eh_funcionario():
+        flash("Acesso negado. Somente funcionários podem cadastrar livros.")
+        return redirect(url_for("auth.login"))
+
+    if request.method == "POST":
+        livro_id = request.form.get('livro_id', type=int)
+        aluno_id = request.form.get('aluno_id', type=int)
+
+        if not livro_id or not aluno_id:
+            flash("Selecione um livro e um aluno.")
+            return redirect(url_for('circulacao.alugar'))
+
+        # O aluguel inteiro é uma única transação. Os UPDATEs condicionais
+        # reservam a cópia e a vaga do aluno de forma atômica, então dois
+        # funcionários não conseguem alugar a mesma última cópia
+        livro_reservado = db.session.execute(
+            update(Livro)
+            .where(Livro.idLivro == livro_id, Livro.qtdeLivDisponiveis > 0)
+            .values(qtdeLivDisponiveis=Livro.qtdeLivDisponiveis - 1)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not livro_reservado:
+            db.session.rollback()
+            if db.session.get(Livro, livro_id) is None:
+                flash("Livro não encontrado.")
+            else:
+                flash("Não há mais cópias disponíveis deste livro.")
+            return redirect(url_for('circulacao.alugar'))
+
+        # Verificar se o aluno já alugou 3 livros
+        vaga_reservada = db.session.execute(
+            update(Aluno)
+            .where(Aluno.id == aluno_id, Aluno.qtdeLivros < LIMITE_LIVROS_ALUNO)
+            .values(qtdeLivros=Aluno.qtdeLivros + 1)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not vaga_reservada:
+            db.session.rollback()
+            if db.session.get(Aluno, aluno_id) is None:
+                flash("Aluno não encontrado.")
+            else:
+                flash("O aluno selecionnado já alugou o máximo de livros permitido.")
+            return redirect(url_for('circulacao.alugar'))
+
+        livros_alugados = LivrosAlugados()
+        livros_alugados.aluno_id = aluno_id
+        livros_alugados.livro_id = livro_id
+        livros_alugados.dataAluguel = date.today()
+        livros_alugados.dataDevolucao = livros_alugados.dataAluguel + timedelta(days=PRAZO_DEVOLUCAO_DIAS)
+        db.session.add(livros_alugados)
+        registrar_circulacao(livros_alugados.dataAluguel, livro_id, aluno_id, emprestimos=1)
+        incrementar_versao("livros", "alugueis")
+        db.session.commit()
+
+        flash("Livro alugado com sucesso!")
+        return redirect(url_for('catalogo.livros'))
+
+    return render_template("formulario_aluguel.html")
+
+@bp.route("/sugestoes/alunos")
+@login_required
+def sugestoes_alunos():
+    if not eh_funcionario():
+        return jsonify(erro="Acesso negado."), 403
+
+    termo = request.args.get("q", "").strip()
+    if not termo:
+        return jsonify([])
+
+    filtro, ordem = filtro_prefixo(User.name, termo)
+    alunos = db.session.query(Aluno.id, User.name, Aluno.numeroAluno).join(
+        User, User.id == Aluno.user_id
+    ).filter(filtro).order_by(ordem).limit(LIMITE_SUGESTOES).all()
+    return jsonify([
+        {"id": aluno.id, "nome": aluno.name, "numero": aluno.numeroAluno}
+        for aluno in alunos
+    ])
+
+@bp.route("/devolver", methods=["GET", "POST"])
+@login_required
+def devolver():
+    if not eh_funcionario():
+        flash("Acesso negado. Somente funcionários podem devolver livros.")
+        return redirect(url_for("auth.login"))
+
+    if request.method == "POST":
+        livro_alugado_id = request.form.get('livro_alugado_id', type=int)
+
+        if not livro_alugado_id:
+            flash("Selecione um livro para devolver.")
+            return redirect(url_for('circulacao.devolver'))
+
+        # Devolução numa única transação. Se o aluguel já não existe (envio
+        # duplicado do formulário ou outro funcionário devolveu antes), nada
+        # é alterado e a devolução é tratada como já feita
+        livro_alugado = db.session.get(LivrosAlugados, livro_alugado_id)
+        removido = livro_alugado is not None and db.session.execute(
+            delete(LivrosAlugados)
+            .where(LivrosAlugados.id == livro_alugado_id)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not removido:
+            db.session.rollback()
+            flash("Este livro já foi devolvido.")
+            return redirect(url_for('circulacao.livros_alugados'))
+
+        db.session.execute(
+            update(Livro)
+            .where(Livro.idLivro == livro_alugado.livro_id, Livro.qtdeLivDisponiveis < Livro.quantidadeLivros)
+            .values(qtdeLivDisponiveis=Livro.qtdeLivDisponiveis + 1)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.execute(
+            update(Aluno)
+            .where(Aluno.id == livro_alugado.aluno_id, Aluno.qtdeLivros > 0)
+            .values(qtdeLivros=Aluno.qtdeLivros - 1)
+            .execution_options(synchronize_session=False)
+        )
+        registrar_circulacao(date.today(), livro_alugado.livro_id, livro_alugado.aluno_id, devolucoes=1)
+        incrementar_versao("livros", "alugueis")
+        db.session.commit()
+
+        flash("Livro devolvido com sucesso!")
+        return redirect(url_for('circulacao.livros_alugados'))
+
+    livros_alugados = consulta_alugueis().order_by(LivrosAlugados.id).all()
+    return render_template("formulario_devolucao.html", livros_alugados=livros_alugados)
+
@@ -0,0 +1,96 @@
+import os
+import re
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+
+# Configuração padrão do app, lida das variáveis de ambiente. create_app()
+# aplica esta e depois a configuração recebida, que tem prioridade
+def configuracao_padrao():
+    return {
+        "SECRET_KEY": os.environ.get("SECRET_KEY", "secret"),
+        # Token para o Prometheus ler /metrics sem sessão (Authorization: Bearer <token>)
+        "METRICS_TOKEN": os.environ.get("METRICS_TOKEN"),
+        "METRICS_LOG_JSON": os.environ.get("METRICS_LOG_JSON", "0") == "1",
+        "USER_CACHE_SIZE": int(os.environ.get("USER_CACHE_SIZE", 1024)),
+        "USER_CACHE_TTL": int(os.environ.get("USER_CACHE_TTL", 60)),
+        # Custo do hash de senhas (hashes antigos são refeitos no login) e
+        # tamanho do pool que calcula os hashes
+        "PASSWORD_HASH_METHOD": os.environ.get("PASSWORD_HASH_METHOD", "pbkdf2:sha256:600000"),
+        "HASH_WORKERS": int(os.environ.get("HASH_WORKERS", 2)),
+        "HASH_TIMEOUT": float(os.environ.get("HASH_TIMEOUT", 10)),
+        # Tentativas de login/registro permitidas por IP e por email ("quantidade/segundos")
+        "RATE_LIMIT_IP": os.environ.get("RATE_LIMIT_IP", "20/60"),
+        "RATE_LIMIT_EMAIL": os.environ.get("RATE_LIMIT_EMAIL", "5/60"),
+        # Validade dos links de ativação das contas criadas por lista de alunos
+        "ATIVACAO_VALIDADE_DIAS": int(os.environ.get("ATIVACAO_VALIDADE_DIAS", 30)),
+        # Cache das tabelas renderizadas: "memoria" (por processo), "disco"
+        # (compartilhado pelos workers, em FRAGMENT_CACHE_DIR) ou "nenhum"
+        "FRAGMENT_CACHE": os.environ.get("FRAGMENT_CACHE", "memoria"),
+        "FRAGMENT_CACHE_BYTES": int(os.environ.get("FRAGMENT_CACHE_BYTES", 32 * 1024 * 1024)),
+        "FRAGMENT_CACHE_DIR": os.environ.get("FRAGMENT_CACHE_DIR", ""),
+        **configuracao_banco(),
+    }
+
+
+# Configuração do banco lida das variáveis de ambiente. DATABASE_URL aceita
+# qualquer URL do SQLAlchemy (sqlite, postgresql, mysql...); caminhos
+# relativos do SQLite ficam na pasta instance/
+def configuracao_banco():
+    url = os.environ.get("DATABASE_URL", "sqlite:///applivro.db")
+    # Alguns provedores ainda entregam o esquema antigo "postgres://"
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+
+    opcoes = {"pool_pre_ping": os.environ.get("DB_POOL_PRE_PING", "0") == "1"}
+    # O SQLite em memória usa uma conexão só (StaticPool), sem tamanho de pool
+    em_memoria = url.startswith("sqlite") and make_url(url).database in (None, "", ":memory:")
+    for variavel, opcao, tipo in [
+        ("DB_POOL_SIZE", "pool_size", int),
+        ("DB_MAX_OVERFLOW", "max_overflow", int),
+        ("DB_POOL_TIMEOUT", "pool_timeout", float),
+        ("DB_POOL_RECYCLE", "pool_recycle", int),
+    ]:
+        if os.environ.get(variavel) and not em_memoria:
+            opcoes[opcao] = tipo(os.environ[variavel])
+
+    return {
+        "SQLALCHEMY_DATABASE_URI": url,
+        "SQLALCHEMY_ENGINE_OPTIONS": opcoes,
+        # PRAGMAs aplicados a cada conexão nova do SQLite; valor vazio desliga
+        "SQLITE_PRAGMAS": {
+            "journal_mode": os.environ.get("SQLITE_JOURNAL_MODE", "WAL"),
+            "synchronous": os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+            "busy_timeout": os.environ.get("SQLITE_BUSY_TIMEOUT", "5000"),
+            "mmap_size": os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)),
+            # Negativo = tamanho em KiB
+            "cache_size": os.environ.get("SQLITE_CACHE_SIZE", "-65536"),
+            "foreign_keys": os.environ.get("SQLITE_FOREIGN_KEYS", ""),
+        },
+    }
+
+
+# Registra os PRAGMAs no evento "connect" do engine. O journal_mode=WAL fica
+# gravado no arquivo, mas os outros valem só para a conexão, por isso são
+# repetidos em cada uma
+def aplicar_pragmas_sqlite(engine, pragmas):
+    if engine.dialect.name != "sqlite":
+        return
+    pragmas = {nome: str(valor) for nome, valor in pragmas.items() if valor not in (None, "")}
+    for nome, valor in pragmas.items():
+        if not re.fullmatch(r"-?\w+", valor):
+            raise ValueError(f"valor inválido para PRAGMA {nome}: {valor!r}")
+    # Bancos em memória não usam WAL nem mmap
+    if make_url(str(engine.url)).database in (None, "", ":memory:"):
+        pragmas.pop("journal_mode", None)
+        pragmas.pop("mmap_size", None)
+
+    @event.listens_for(engine, "connect")
+    def configurar_conexao(conexao, registro):
+        cursor = conexao.cursor()
+        try:
+            for nome, valor in pragmas.items():
+                cursor.execute(f"PRAGMA {nome}={valor}")
+        finally:
+            cursor.close()
@@ -0,0 +1,447 @@
+import random
+from bisect import bisect
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from itertools import accumulate
+from time import perf_counter
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import bindparam, delete, insert, text, update
+
+from circulacao import LIMITE_LIVROS_ALUNO, PRAZO_DEVOLUCAO_DIAS
+from extensions import db, senhas
+from models import (
+    Aluno, CirculacaoAluno, CirculacaoLivro, Funcionario, Livro, LivrosAlugados, TokenAtivacao, User,
+)
+from versoes import incrementar_versao
+
+
+# Gerador de bibliotecas sintéticas para medir desempenho com volumes reais.
+# Tudo sai de um único random.Random(semente): a mesma semente e os mesmos
+# parâmetros geram o mesmo banco
+
+LINHAS_POR_LOTE = 10000
+
+NOMES = [
+    "Ana", "Maria", "Juliana", "Beatriz", "Camila", "Larissa", "Fernanda", "Gabriela", "Letícia", "Mariana",
+    "Amanda", "Bruna", "Carolina", "Isabela", "Júlia", "Laura", "Luana", "Natália", "Patrícia", "Rafaela",
+    "João", "Pedro", "Lucas", "Gabriel", "Matheus", "Arthur", "Rafael", "Gustavo", "Felipe", "Bruno",
+    "Thiago", "Leonardo", "Diego", "Eduardo", "Rodrigo", "Vinícius", "Henrique", "Caio", "Daniel", "André",
+]
+SOBRENOMES = [
+    "Silva", "Santos", "Oliveira", "Souza", "Rodrigues", "Ferreira", "Alves", "Pereira", "Lima", "Gomes",
+    "Costa", "Ribeiro", "Martins", "Carvalho", "Almeida", "Lopes", "Soares", "Fernandes", "Vieira", "Barbosa",
+    "Rocha", "Dias", "Nascimento", "Andrade", "Moreira", "Nunes", "Marques", "Machado", "Mendes", "Freitas",
+    "Cardoso", "Ramos", "Gonçalves", "Santana", "Teixeira", "Araújo", "Pinto", "Vasques", "Correia", "Moraes",
+]
+RUAS = [
+    "Rua das Flores", "Avenida Brasil", "Rua XV de Novembro", "Rua Sete de Setembro", "Avenida Paulista",
+    "Rua dos Andradas", "Rua da Consolação", "Avenida Getúlio Vargas", "Rua Tiradentes", "Rua São João",
+    "Avenida Rio Branco", "Rua Barão do Rio Branco", "Rua Santos Dumont", "Rua Marechal Deodoro",
+]
+EDITORAS = [
+    "Companhia das Letras", "Editora Record", "Rocco", "Saraiva", "Ática", "Moderna", "Globo Livros",
+    "Intrínseca", "Zahar", "Nova Fronteira", "Martins Fontes", "Editora 34", "Objetiva", "Sextante",
+    "Bertrand Brasil", "Blucher", "LTC", "Novatec", "Casa do Código", "Edições Loyola", "Vozes",
+    "Paz e Terra", "Autêntica", "L&PM", "Cosac Naify", "Scipione", "FTD", "Melhoramentos",
+]
+# Editoras grandes publicam mais títulos
+PESOS_EDITORAS = [12, 10, 9, 9, 8, 8, 7, 7, 6, 6, 5, 5, 5, 5, 4, 4, 4, 3, 3, 3, 3, 3, 2, 2, 2, 2, 2, 2]
+
+SUBSTANTIVOS = [
+    ("O", "Segredo"), ("A", "Casa"), ("O", "Livro"), ("A", "Noite"), ("O", "Rio"), ("A", "Cidade"),
+    ("O", "Caminho"), ("A", "Memória"), ("O", "Jardim"), ("A", "Viagem"), ("O", "Silêncio"), ("A", "Estrela"),
+    ("O", "Mar"), ("A", "Sombra"), ("O", "Tempo"), ("A", "Ilha"), ("O", "Sertão"), ("A", "Floresta"),
+    ("O", "Menino"), ("A", "Menina"), ("O", "Último Verão"), ("A", "Carta"), ("O", "Espelho"), ("A", "Herança"),
+]
+COMPLEMENTOS = [
+    "das Águas", "do Vento", "da Serra", "de Pedra", "do Norte", "da Lua", "de Ninguém", "do Cais",
+    "da Madrugada", "dos Esquecidos", "de Papel", "do Farol", "da Fronteira", "de Areia", "do Sul",
+    "da Chuva", "de Outono", "do Mundo", "das Horas", "de Vidro",
+]
+AREAS = [
+    "Cálculo", "Álgebra Linear", "Física", "Química Orgânica", "Biologia Celular", "História do Brasil",
+    "Geografia", "Filosofia", "Sociologia", "Economia", "Direito Constitucional", "Programação em Python",
+    "Estruturas de Dados", "Bancos de Dados", "Redes de Computadores", "Estatística", "Literatura Brasileira",
+    "Gramática", "Administração", "Contabilidade", "Psicologia", "Anatomia", "Engenharia de Software",
+]
+MODELOS_TECNICOS = [
+    "Introdução à {}", "Fundamentos de {}", "{} para Iniciantes", "Manual de {}", "{}: Teoria e Prática",
+    "Curso de {}", "{} Aplicada", "Tópicos em {}", "Exercícios de {}",
+]
+
+
+# Título com cara de catálogo: ficção ("A Casa das Águas") ou didático
+# ("Fundamentos de Estatística"), às vezes com volume ou edição
+def gerar_titulo(aleatorio):
+    if aleatorio.random() < 0.55:
+        artigo, substantivo = aleatorio.choice(SUBSTANTIVOS)
+        titulo = f"{artigo} {substantivo} {aleatorio.choice(COMPLEMENTOS)}"
+    else:
+        titulo = aleatorio.choice(MODELOS_TECNICOS).format(aleatorio.choice(AREAS))
+        sorteio = aleatorio.random()
+        if sorteio < 0.15:
+            titulo += f" - Volume {aleatorio.randint(1, 4)}"
+        elif sorteio < 0.3:
+            titulo += f" - {aleatorio.randint(2, 12)}ª edição"
+    return titulo[:100]
+
+
+def gerar_nome(aleatorio):
+    return f"{aleatorio.choice(NOMES)} {aleatorio.choice(SOBRENOMES)} {aleatorio.choice(SOBRENOMES)}"
+
+
+def _pesos_acumulados(pesos):
+    return list(accumulate(pesos))
+
+
+# Popularidade segue uma lei de Zipf: poucos títulos concentram a maior
+# parte dos aluguéis
+def _pesos_zipf(quantidade, expoente=1.0):
+    return _pesos_acumulados(1 / (posicao ** expoente) for posicao in range(1, quantidade + 1))
+
+
+# Peso de cada dia do histórico: menos movimento no fim de semana e nas
+# férias escolares (janeiro, julho e dezembro)
+def _peso_dia(dia):
+    peso = 0.25 if dia.weekday() >= 5 else 1.0
+    if dia.month in (1, 7):
+        peso *= 0.35
+    elif dia.month == 12:
+        peso *= 0.6
+    return peso
+
+
+# Prazos de devolução: a maioria entre uma e três semanas, com atrasos raros
+DURACOES = list(range(1, 61))
+PESOS_DURACOES = _pesos_acumulados(
+    3.0 if 7 <= dias <= 14 else 1.5 if dias <= 21 else 0.5 if dias < 7 else 0.08
+    for dias in DURACOES
+)
+
+
+def _proximo_id(coluna):
+    return (db.session.scalar(db.select(db.func.max(coluna))) or 0) + 1
+
+
+def _inserir(tabela, linhas):
+    lote = []
+    total = 0
+    for linha in linhas:
+        lote.append(linha)
+        if len(lote) >= LINHAS_POR_LOTE:
+            db.session.execute(insert(tabela), lote)
+            total += len(lote)
+            lote = []
+    if lote:
+        db.session.execute(insert(tabela), lote)
+        total += len(lote)
+    return total
+
+
+# Apaga todos os dados da biblioteca, na ordem das chaves estrangeiras
+def limpar_dados():
+    for modelo in (LivrosAlugados, CirculacaoLivro, CirculacaoAluno, TokenAtivacao, Aluno, Funcionario, User, Livro):
+        db.session.execute(delete(modelo).execution_options(synchronize_session=False))
+    if db.engine.dialect.name == "sqlite":
+        db.session.execute(text("INSERT INTO livros_busca(livros_busca) VALUES ('rebuild')"))
+
+
+class GeradorBiblioteca:
+    def __init__(self, semente, hoje=None):
+        self.aleatorio = random.Random(semente)
+        self.hoje = hoje or date.today()
+        self.tempos = {}
+
+    def _medir(self, etapa, inicio):
+        self.tempos[etapa] = perf_counter() - inicio
+
+    def livros(self, quantidade):
+        inicio = perf_counter()
+        aleatorio = self.aleatorio
+        primeiro = _proximo_id(Livro.idLivro)
+        ano_atual = self.hoje.year
+        editoras = _pesos_acumulados(PESOS_EDITORAS)
+        self.ids_livros = list(range(primeiro, primeiro + quantidade))
+        self.pesos_livros = _pesos_zipf(quantidade)
+        self.copias = {}
+        for livro_id in self.ids_livros:
+            # A maioria tem uma ou duas cópias; os títulos populares (os
+            # primeiros pela lei de Zipf) têm mais
+            posicao = livro_id - primeiro
+            extra = 6 if posicao < quantidade * 0.01 else 2 if posicao < quantidade * 0.1 else 0
+            self.copias[livro_id] = 1 + int(aleatorio.expovariate(1.2)) + aleatorio.randint(0, extra)
+
+        def linhas():
+            for livro_id in self.ids_livros:
+                yield {
+                    "idLivro": livro_id,
+                    "tituloLivro": gerar_titulo(aleatorio),
+                    "editora": EDITORAS[bisect(editoras, aleatorio.random() * editoras[-1])],
+                    # Acervo concentrado nas últimas décadas
+                    "anoLivro": int(aleatorio.triangular(1950, ano_atual + 1, ano_atual)),
+                    "quantidadeLivros": self.copias[livro_id],
+                    "qtdeLivDisponiveis": self.copias[livro_id],
+                }
+
+        total = _inserir(Livro.__table__, linhas())
+        self._medir("livros", inicio)
+        return total
+
+    def usuarios(self, alunos, funcionarios, hash_senha):
+        inicio = perf_counter()
+        aleatorio = self.aleatorio
+        primeiro_usuario = _proximo_id(User.id)
+        primeiro_aluno = _proximo_id(Aluno.id)
+        primeiro_funcionario = _proximo_id(Funcionario.id)
+        self.ids_alunos = list(range(primeiro_aluno, primeiro_aluno + alunos))
+        # Alguns alunos alugam bem mais que outros
+        self.pesos_alunos = _pesos_zipf(alunos, expoente=0.5)
+        self.usuario_funcionario = None
+        nomes = {}
+
+        def usuarios():
+            for indice in range(alunos + funcionarios):
+                usuario_id = primeiro_usuario + indice
+                nome = gerar_nome(aleatorio)
+                nomes[usuario_id] = nome
+                dominio = "aluno" if indice < alunos else "funcionario"
+                # O id no email garante que ele é único mesmo em gerações sucessivas
+                email = f"{nome.split()[0].lower()}.{usuario_id}@{dominio}.exemplo.com"
+                if indice == alunos:
+                    self.usuario_funcionario = email
+                yield {"id": usuario_id, "name": nome, "email": email, "password": hash_senha()}
+
+        def linhas_alunos():
+            for indice, aluno_id in enumerate(self.ids_alunos):
+                yield {
+                    "id": aluno_id,
+                    "user_id": primeiro_usuario + indice,
+                    "endereco": f"{aleatorio.choice(RUAS)}, {aleatorio.randint(1, 3000)}",
+                    "telefone": f"({aleatorio.randint(11, 99)}) 9{aleatorio.randint(1000, 9999)}-{aleatorio.randint(1000, 9999)}",
+                    "numeroAluno": 100000 + aluno_id,
+                    "qtdeLivros": 0,
+                    "pendencias": False,
+                }
+
+        def linhas_funcionarios():
+            for indice in range(funcionarios):
+                usuario_id = primeiro_usuario + alunos + indice
+                yield {
+                    "id": primeiro_funcionario + indice,
+                    "user_id": usuario_id,
+                    "numeroFuncionario": 1000 + primeiro_funcionario + indice,
+                    "nomeFuncionario": nomes[usuario_id],
+                }
+
+        total = _inserir(User.__table__, usuarios())
+        _inserir(Aluno.__table__, linhas_alunos())
+        _inserir(Funcionario.__table__, linhas_funcionarios())
+        self._medir("usuarios", inicio)
+        return total
+
+    # Aluguéis em aberto, respeitando as cópias de cada livro e o limite de
+    # livros por aluno. A data segue uma exponencial: a maioria é recente e
+    # alguns estão bem atrasados. Devolve os aluguéis agrupados por dia
+    def abertos(self, quantidade):
+        inicio = perf_counter()
+        aleatorio = self.aleatorio
+        disponiveis = dict(self.copias)
+        vagas = dict.fromkeys(self.ids_alunos, LIMITE_LIVROS_ALUNO)
+        capacidade = min(sum(disponiveis.values()), LIMITE_LIVROS_ALUNO * len(vagas))
+        if quantidade > capacidade:
+            click.echo(f"Só cabem {capacidade} aluguéis em aberto com esses livros e alunos.", err=True)
+            quantidade = capacidade
+
+        alugueis = []
+        while len(alugueis) < quantidade:
+            # Sorteia em blocos; livros esgotados e alunos no limite são
+            # pulados. Quando sobram poucos, sorteia entre os que restam
+            faltam = quantidade - len(alugueis)
+            if faltam < quantidade * 0.05 or faltam < 1000:
+                livros = aleatorio.choices([livro for livro, resta in disponiveis.items() if resta], k=faltam)
+                alunos = aleatorio.choices([aluno for aluno, resta in vagas.items() if resta], k=faltam)
+            else:
+                livros = aleatorio.choices(self.ids_livros, cum_weights=self.pesos_livros, k=faltam)
+                alunos = aleatorio.choices(self.ids_alunos, cum_weights=self.pesos_alunos, k=faltam)
+            for livro_id, aluno_id in zip(livros, alunos):
+                if disponiveis[livro_id] and vagas[aluno_id]:
+                    disponiveis[livro_id] -= 1
+                    vagas[aluno_id] -= 1
+                    dias = min(int(aleatorio.expovariate(1 / 8)), 180)
+                    alugueis.append((self.hoje - timedelta(days=dias), livro_id, aluno_id))
+
+        # Mesmo prazo de devolução que alugar() grava
+        def devolucao(dia):
+            return dia + timedelta(days=PRAZO_DEVOLUCAO_DIAS)
+
+        def linhas():
+            for dia, livro_id, aluno_id in alugueis:
+                yield {"livro_id": livro_id, "aluno_id": aluno_id, "dataAluguel": dia, "dataDevolucao": devolucao(dia)}
+
+        _inserir(LivrosAlugados.__table__, linhas())
+
+        # Contadores iguais aos aluguéis gerados
+        emprestados = Counter(livro_id for _, livro_id, _ in alugueis)
+        # Aluguel com a data de devolução já passada deixa o aluno com pendência
+        atrasados = {aluno_id for dia, _, aluno_id in alugueis if devolucao(dia) < self.hoje}
+        if alugueis:
+            db.session.execute(
+                update(Livro.__table__)
+                .where(Livro.idLivro == bindparam("livro"))
+                .values(qtdeLivDisponiveis=Livro.quantidadeLivros - bindparam("emprestados")),
+                [{"livro": livro_id, "emprestados": total} for livro_id, total in emprestados.items()],
+            )
+            db.session.execute(
+                update(Aluno.__table__)
+                .where(Aluno.id == bindparam("aluno"))
+                .values(qtdeLivros=LIMITE_LIVROS_ALUNO - bindparam("vagas"), pendencias=bindparam("atrasado")),
+                [
+                    {"aluno": aluno_id, "vagas": resta, "atrasado": aluno_id in atrasados}
+                    for aluno_id, resta in vagas.items()
+                    if resta < LIMITE_LIVROS_ALUNO
+                ],
+            )
+
+        por_dia = defaultdict(list)
+        for dia, livro_id, aluno_id in alugueis:
+            por_dia[dia].append((livro_id, aluno_id))
+        self._medir("abertos", inicio)
+        return len(alugueis), por_dia
+
+    # Aluguéis já devolvidos. Devolver apaga o aluguel, então o histórico só
+    # existe nos totais diários de circulação: os aluguéis são gerados dia a
+    # dia e cada devolução fica pendente até o dia em que acontece, o que
+    # mantém na memória só a janela dos prazos em andamento
+    def historico(self, quantidade, dias, abertos_por_dia):
+        inicio = perf_counter()
+        aleatorio = self.aleatorio
+        primeiro_dia = self.hoje - timedelta(days=dias)
+        calendario = [primeiro_dia + timedelta(days=n) for n in range(dias + 1)]
+        por_dia = Counter()
+        if quantidade and dias:
+            por_dia.update(aleatorio.choices(
+                calendario[:-1], cum_weights=_pesos_acumulados(map(_peso_dia, calendario[:-1])), k=quantidade
+            ))
+        devolucoes_livros = defaultdict(Counter)
+        devolucoes_alunos = defaultdict(Counter)
+        totais = {"livros": 0, "alunos": 0}
+
+        def linhas(emprestimos, devolucoes, coluna, dia):
+            for chave in emprestimos.keys() | devolucoes.keys():
+                yield {"dia": dia, coluna: chave, "emprestimos": emprestimos[chave], "devolucoes": devolucoes[chave]}
+
+        def dias_gerados():
+            for dia in calendario:
+                abertos = abertos_por_dia.get(dia, [])
+                total = por_dia.get(dia, 0)
+                livros = aleatorio.choices(self.ids_livros, cum_weights=self.pesos_livros, k=total)
+                alunos = aleatorio.choices(self.ids_alunos, cum_weights=self.pesos_alunos, k=total)
+                duracoes = aleatorio.choices(DURACOES, cum_weights=PESOS_DURACOES, k=total)
+                for livro_id, aluno_id, duracao in zip(livros, alunos, duracoes):
+                    devolucao = min(dia + timedelta(days=duracao), self.hoje)
+                    devolucoes_livros[devolucao][livro_id] += 1
+                    devolucoes_alunos[devolucao][aluno_id] += 1
+                livros += [livro_id for livro_id, _ in abertos]
+                alunos += [aluno_id for _, aluno_id in abertos]
+                yield dia, Counter(livros), Counter(alunos)
+
+        def linhas_livros(dia, emprestimos):
+            return linhas(emprestimos, devolucoes_livros.pop(dia, Counter()), "livro_id", dia)
+
+        def linhas_alunos(dia, emprestimos):
+            return linhas(emprestimos, devolucoes_alunos.pop(dia, Counter()), "aluno_id", dia)
+
+        lote_livros, lote_alunos = [], []
+        for dia, livros, alunos in dias_gerados():
+            lote_livros.extend(linhas_livros(dia, livros))
+            lote_alunos.extend(linhas_alunos(dia, alunos))
+            if len(lote_livros) >= LINHAS_POR_LOTE:
+                totais["livros"] += _inserir(CirculacaoLivro.__table__, lote_livros)
+                lote_livros = []
+            if len(lote_alunos) >= LINHAS_POR_LOTE:
+                totais["alunos"] += _inserir(CirculacaoAluno.__table__, lote_alunos)
+                lote_alunos = []
+        totais["livros"] += _inserir(CirculacaoLivro.__table__, lote_livros)
+        totais["alunos"] += _inserir(CirculacaoAluno.__table__, lote_alunos)
+        self._medir("historico", inicio)
+        return totais
+
+
+# Gera todos os dados numa única transação e atualiza as estatísticas do
+# SQLite para o planejador de consultas
+def gerar_biblioteca(livros, alunos, funcionarios, historico, abertos, dias, semente, hash_senha):
+    gerador = GeradorBiblioteca(semente)
+    try:
+        total_livros = gerador.livros(livros)
+        gerador.usuarios(alunos, funcionarios, hash_senha)
+        total_abertos, abertos_por_dia = gerador.abertos(abertos)
+        totais = gerador.historico(historico, dias, abertos_por_dia)
+        incrementar_versao("livros", "alugueis")
+        db.session.commit()
+    except BaseException:
+        db.session.rollback()
+        raise
+    if db.engine.dialect.name == "sqlite":
+        with db.engine.connect() as conexao:
+            conexao.exec_driver_sql("ANALYZE")
+    return gerador, total_livros, total_abertos, totais
+
+
+@click.command("seed")
+@click.option("--livros", default=10000, show_default=True, help="Títulos no catálogo.")
+@click.option("--alunos", default=2000, show_default=True)
+@click.option("--funcionarios", default=10, show_default=True)
+@click.option("--historico", default=100000, show_default=True, help="Aluguéis já devolvidos (vão para os totais diários).")
+@click.option("--abertos", default=3000, show_default=True, help="Aluguéis em aberto.")
+@click.option("--dias", default=730, show_default=True, help="Dias de histórico até hoje.")
+@click.option("--semente", default=42, show_default=True, help="Mesma semente, mesmos dados.")
+@click.option("--senha", default="senha123", show_default=True, help="Senha de todos os usuários gerados.")
+@click.option(
+    "--hash-individual", is_flag=True,
+    help="Calcula um hash por usuário com o custo configurado (lento). Por padrão um único hash é compartilhado.",
+)
+@click.option("--limpar", is_flag=True, help="Apaga os dados existentes antes de gerar.")
+@with_appcontext
+def gerar_dados(livros, alunos, funcionarios, historico, abertos, dias, semente, senha, hash_individual, limpar):
+    """Gera uma biblioteca sintética (livros, usuários e aluguéis) em lote.
+
+    Exemplo com um milhão de aluguéis:
+    flask seed --livros 50000 --alunos 20000 --historico 1000000 --abertos 20000 --limpar
+    """
+    from banco import inicializar_banco
+
+    if min(livros, alunos) < 1 or min(funcionarios, historico, abertos, dias) < 0:
+        raise click.BadParameter("use ao menos um livro e um aluno, e valores não negativos.")
+    if limpar:
+        click.confirm("Apagar todos os livros, usuários e aluguéis do banco?", abort=True)
+
+    inicio = perf_counter()
+    inicializar_banco()
+    if limpar:
+        limpar_dados()
+
+    if hash_individual:
+        def hash_senha():
+            return senhas.gerar(senha)
+    else:
+        compartilhado = senhas.gerar(senha)
+
+        def hash_senha():
+            return compartilhado
+
+    gerador, total_livros, total_abertos, totais = gerar_biblioteca(
+        livros, alunos, funcionarios, historico, abertos, dias, semente, hash_senha
+    )
+
+    etapas = ", ".join(f"{etapa} {tempo:.1f}s" for etapa, tempo in gerador.tempos.items())
+    click.echo(
+        f"{total_livros} livros, {alunos} alunos, {funcionarios} funcionários, {historico} aluguéis devolvidos e "
+        f"{total_abertos} em aberto ({totais['livros']} + {totais['alunos']} totais diários) "
+        f"em {perf_counter() - inicio:.1f}s ({etapas})."
+    )
+    if gerador.usuario_funcionario:
+        click.echo(f"Funcionário para login: {gerador.usuario_funcionario} / {senha}")
+    click.echo(f"Banco: {current_app.config['SQLALCHEMY_DATABASE_URI']}")
@@ -0,0 +1,278 @@
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import threading
+from time import monotonic, perf_counter
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, select, update
+
+from benchmark import percentil
+from circulacao import LIMITE_LIVROS_ALUNO
+from extensions import db
+
+
+# Teste de estresse do aluguel e da devolução: vários funcionários (threads,
+# e threads em processos separados) alugam e devolvem ao mesmo tempo as
+# últimas cópias de poucos títulos, num banco SQLite em arquivo. No fim as
+# invariantes do acervo são conferidas no banco
+
+# Configuração dos apps do teste: sem cache de trechos (cada processo teria
+# o seu) e sem limite de tentativas
+CONFIGURACAO = {
+    "FRAGMENT_CACHE": "nenhum",
+    "RATE_LIMIT_IP": "1000000/1",
+    "RATE_LIMIT_EMAIL": "1000000/1",
+}
+
+
+# Banco com "titulos" livros de "copias" cópias cada, "alunos" alunos, um
+# funcionário e nenhum aluguel. Devolve os ids usados pelos trabalhadores
+def preparar_banco(caminho, titulos, copias, alunos, semente):
+    from app import create_app
+    from banco import inicializar_banco
+    from dados_sinteticos import gerar_biblioteca
+    from models import Aluno, Funcionario, Livro
+
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{caminho}", **CONFIGURACAO})
+    with app.app_context():
+        inicializar_banco()
+        gerar_biblioteca(
+            livros=titulos, alunos=alunos, funcionarios=1, historico=0, abertos=0, dias=0,
+            semente=semente, hash_senha=lambda: "!",
+        )
+        db.session.execute(update(Livro).values(quantidadeLivros=copias, qtdeLivDisponiveis=copias))
+        db.session.commit()
+        ids = {
+            "livros": db.session.scalars(select(Livro.idLivro)).all(),
+            "alunos": db.session.scalars(select(Aluno.id)).all(),
+            "funcionario": db.session.scalar(select(Funcionario.user_id)),
+        }
+        db.session.remove()
+        db.engine.dispose()
+    return ids
+
+
+# Um funcionário: aluga (livro e aluno sorteados) ou devolve (aluguel em
+# aberto sorteado) até o prazo acabar. Conta só o que a resposta mostra:
+# aluguel feito é o redirecionamento para a listagem, recusa é a volta ao
+# formulário e erro é qualquer resposta 5xx. As devoluções incluem as de
+# aluguéis que outro funcionário devolveu antes (a rota trata como feitas)
+def trabalhar(app, ids, segundos, semente, proporcao_aluguel, resultado):
+    from models import LivrosAlugados
+
+    aleatorio = random.Random(semente)
+    cliente = app.test_client()
+    with cliente.session_transaction() as sessao:
+        sessao["_user_id"] = str(ids["funcionario"])
+        sessao["_fresh"] = True
+
+    latencias = []
+    contagem = {"alugueis": 0, "recusados": 0, "devolucoes": 0, "erros": 0}
+    fim = monotonic() + segundos
+    while monotonic() < fim:
+        aluguel_id = None
+        if aleatorio.random() >= proporcao_aluguel:
+            with app.app_context():
+                aluguel_id = db.session.scalar(select(LivrosAlugados.id).order_by(func.random()).limit(1))
+
+        inicio = perf_counter()
+        if aluguel_id is None:
+            resposta = cliente.post("/alugar", data={
+                "livro_id": aleatorio.choice(ids["livros"]),
+                "aluno_id": aleatorio.choice(ids["alunos"]),
+            })
+        else:
+            resposta = cliente.post("/devolver", data={"livro_alugado_id": aluguel_id})
+        latencias.append((perf_counter() - inicio) * 1000)
+
+        if resposta.status_code >= 500:
+            contagem["erros"] += 1
+        elif aluguel_id is not None:
+            contagem["devolucoes"] += 1
+        elif resposta.location.endswith("/alugar"):
+            contagem["recusados"] += 1
+        else:
+            contagem["alugueis"] += 1
+
+    resultado.append((contagem, latencias))
+
+
+# Roda "threads" trabalhadores neste processo. A barreira (quando há vários
+# processos) faz todos começarem juntos, depois que os apps foram criados
+def rodar_threads(uri, ids, threads, segundos, semente, proporcao_aluguel, barreira=None, fila=None):
+    from app import create_app
+
+    app = create_app({"SQLALCHEMY_DATABASE_URI": uri, **CONFIGURACAO})
+    resultado = []
+    trabalhadores = [
+        threading.Thread(target=trabalhar, args=(app, ids, segundos, semente * 1000 + n, proporcao_aluguel, resultado))
+        for n in range(threads)
+    ]
+    if barreira is not None:
+        barreira.wait()
+    for trabalhador in trabalhadores:
+        trabalhador.start()
+    for trabalhador in trabalhadores:
+        trabalhador.join()
+    with app.app_context():
+        db.engine.dispose()
+    if fila is not None:
+        fila.put(resultado)
+    return resultado
+
+
+def rodar_processos(uri, ids, processos, threads, segundos, semente, proporcao_aluguel):
+    # spawn: cada processo começa limpo, sem conexões herdadas do pai
+    contexto = multiprocessing.get_context("spawn")
+    barreira = contexto.Barrier(processos + 1)
+    fila = contexto.Queue()
+    filhos = [
+        contexto.Process(
+            target=rodar_threads,
+            args=(uri, ids, threads, segundos, semente + n, proporcao_aluguel, barreira, fila),
+        )
+        for n in range(1, processos + 1)
+    ]
+    for filho in filhos:
+        filho.start()
+    barreira.wait()
+    inicio = perf_counter()
+    resultado = []
+    for _ in filhos:
+        resultado += fila.get()
+    for filho in filhos:
+        filho.join()
+    return resultado, perf_counter() - inicio
+
+
+# Confere o acervo depois do teste. Devolve a lista de violações
+def conferir_invariantes():
+    from models import Aluno, CirculacaoLivro, Livro, LivrosAlugados
+
+    violacoes = []
+    abertos_por_livro = (
+        select(LivrosAlugados.livro_id, func.count().label("abertos")).group_by(LivrosAlugados.livro_id).subquery()
+    )
+    for livro in db.session.execute(
+        select(Livro.idLivro, Livro.quantidadeLivros, Livro.qtdeLivDisponiveis, func.coalesce(abertos_por_livro.c.abertos, 0))
+        .outerjoin(abertos_por_livro, abertos_por_livro.c.livro_id == Livro.idLivro)
+    ):
+        livro_id, quantidade, disponiveis, abertos = livro
+        if disponiveis < 0:
+            violacoes.append(f"livro {livro_id}: disponibilidade negativa ({disponiveis})")
+        if disponiveis > quantidade:
+            violacoes.append(f"livro {livro_id}: {disponiveis} disponíveis de {quantidade} cópias")
+        if quantidade - disponiveis != abertos:
+            violacoes.append(f"livro {livro_id}: {quantidade - disponiveis} cópias emprestadas e {abertos} aluguéis em aberto")
+
+    abertos_por_aluno = (
+        select(LivrosAlugados.aluno_id, func.count().label("abertos")).group_by(LivrosAlugados.aluno_id).subquery()
+    )
+    for aluno in db.session.execute(
+        select(Aluno.id, Aluno.qtdeLivros, func.coalesce(abertos_por_aluno.c.abertos, 0))
+        .outerjoin(abertos_por_aluno, abertos_por_aluno.c.aluno_id == Aluno.id)
+    ):
+        aluno_id, qtde, abertos = aluno
+        if abertos > LIMITE_LIVROS_ALUNO:
+            violacoes.append(f"aluno {aluno_id}: {abertos} aluguéis em aberto (limite {LIMITE_LIVROS_ALUNO})")
+        if qtde != abertos:
+            violacoes.append(f"aluno {aluno_id}: qtdeLivros {qtde} e {abertos} aluguéis em aberto")
+
+    # O banco começa sem aluguéis, então empréstimos menos devoluções nos
+    # totais diários tem que dar o número de aluguéis em aberto
+    emprestimos, devolucoes = db.session.execute(
+        select(func.coalesce(func.sum(CirculacaoLivro.emprestimos), 0), func.coalesce(func.sum(CirculacaoLivro.devolucoes), 0))
+    ).one()
+    abertos = db.session.scalar(select(func.count()).select_from(LivrosAlugados))
+    if emprestimos - devolucoes != abertos:
+        violacoes.append(f"totais diários: {emprestimos} empréstimos - {devolucoes} devoluções, {abertos} em aberto")
+    return violacoes
+
+
+def _resumo(fase, resultado, duracao):
+    totais = {"alugueis": 0, "recusados": 0, "devolucoes": 0, "erros": 0}
+    latencias = []
+    for contagem, medidas in resultado:
+        for chave, valor in contagem.items():
+            totais[chave] += valor
+        latencias += medidas
+    latencias.sort()
+    transacoes = len(latencias)
+    click.echo(
+        f"{fase}: {transacoes} transações em {duracao:.1f}s = {transacoes / duracao:.0f} TPS "
+        f"({totais['alugueis']} aluguéis, {totais['recusados']} recusados, {totais['devolucoes']} devoluções, "
+        f"{totais['erros']} erros)"
+    )
+    if latencias:
+        click.echo(
+            f"  latência p50 {percentil(latencias, 0.5):.1f} ms, p95 {percentil(latencias, 0.95):.1f} ms, "
+            f"p99 {percentil(latencias, 0.99):.1f} ms"
+        )
+    return totais["erros"]
+
+
+@click.command("estresse")
+@click.option("--modo", default="ambos", show_default=True, type=click.Choice(["threads", "processos", "ambos"]))
+@click.option("--threads", default=8, show_default=True, help="Threads por processo.")
+@click.option("--processos", default=4, show_default=True, help="Processos no modo processos.")
+@click.option("--segundos", default=10.0, show_default=True, help="Duração de cada fase.")
+@click.option("--titulos", default=5, show_default=True, help="Títulos disputados.")
+@click.option("--copias", default=2, show_default=True, help="Cópias de cada título.")
+@click.option("--alunos", default=20, show_default=True)
+@click.option("--proporcao-aluguel", default=0.6, show_default=True, help="Fração das operações que são aluguéis.")
+@click.option("--semente", default=42, show_default=True)
+@with_appcontext
+def estresse(modo, threads, processos, segundos, titulos, copias, alunos, proporcao_aluguel, semente):
+    """Aluga e devolve em paralelo e confere que o acervo continua consistente."""
+    from app import create_app
+
+    if min(threads, processos, titulos, copias, alunos) < 1 or segundos <= 0:
+        raise click.BadParameter("use valores positivos.")
+
+    pasta = tempfile.mkdtemp(prefix="estresse-")
+    caminho = os.path.join(pasta, "estresse.db")
+    uri = f"sqlite:///{caminho}"
+    violacoes = []
+    erros = 0
+    try:
+        ids = preparar_banco(caminho, titulos, copias, alunos, semente)
+        click.echo(f"{titulos} títulos com {copias} cópias, {alunos} alunos, banco {caminho}")
+
+        fases = []
+        if modo in ("threads", "ambos"):
+            fases.append(("threads", f"1 processo x {threads} threads"))
+        if modo in ("processos", "ambos"):
+            fases.append(("processos", f"{processos} processos x {threads} threads"))
+
+        app = create_app({"SQLALCHEMY_DATABASE_URI": uri, **CONFIGURACAO})
+        for fase, descricao in fases:
+            if fase == "threads":
+                inicio = perf_counter()
+                resultado = rodar_threads(uri, ids, threads, segundos, semente, proporcao_aluguel)
+                duracao = perf_counter() - inicio
+            else:
+                resultado, duracao = rodar_processos(uri, ids, processos, threads, segundos, semente, proporcao_aluguel)
+            erros += _resumo(descricao, resultado, duracao)
+
+            with app.app_context():
+                encontradas = conferir_invariantes()
+                db.session.remove()
+            for violacao in encontradas:
+                click.echo(f"  VIOLAÇÃO: {violacao}")
+            violacoes += encontradas
+            if not encontradas:
+                click.echo("  invariantes ok")
+        with app.app_context():
+            db.engine.dispose()
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+    if violacoes:
+        raise click.ClickException(f"{len(violacoes)} violação(ões) das invariantes do acervo.")
+    if erros:
+        raise click.ClickException(f"{erros} requisição(ões) com erro do servidor.")
+    click.echo("Nenhuma violação: disponibilidade, limite por aluno e contadores consistentes.")
@@ -0,0 +1,13 @@
+from flask_login import LoginManager
+from flask_sqlalchemy import SQLAlchemy
+
+from metricas import Metricas
+from seguranca import HashSenhas
+
+
+# Extensões criadas sem app; create_app() as liga a cada app com init_app
+db = SQLAlchemy()
+login_manager = LoginManager()
+login_manager.login_view = "auth.login"
+metricas = Metricas()
+senhas = HashSenhas()
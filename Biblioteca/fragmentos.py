@@ -0,0 +1,209 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict, defaultdict
+
+from flask import current_app
+from markupsafe import Markup
+
+from versoes import versao_atual
+
+
+# Cache de trechos de HTML já renderizados (tabelas das listagens). A chave
+# inclui a versão dos dados de que o trecho depende (versoes.py), então
+# nada é invalidado explicitamente: depois de uma escrita a chave muda e as
+# entradas antigas saem pelo limite de tamanho
+
+
+# LRU em memória limitado pelo total de bytes dos trechos. Vale só para o
+# processo atual
+class CacheMemoria:
+    nome = "memoria"
+
+    def __init__(self, limite_bytes):
+        self.limite_bytes = limite_bytes
+        self.itens = OrderedDict()
+        self.bytes = 0
+        self.remocoes = 0
+        self.lock = threading.Lock()
+
+    def get(self, chave):
+        with self.lock:
+            item = self.itens.get(chave)
+            if item is None:
+                return None
+            self.itens.move_to_end(chave)
+            return item[0]
+
+    def set(self, chave, valor):
+        tamanho = len(valor.encode("utf-8"))
+        if tamanho > self.limite_bytes:
+            return
+        with self.lock:
+            anterior = self.itens.pop(chave, None)
+            if anterior is not None:
+                self.bytes -= anterior[1]
+            self.itens[chave] = (valor, tamanho)
+            self.bytes += tamanho
+            while self.bytes > self.limite_bytes:
+                _, (_, removido) = self.itens.popitem(last=False)
+                self.bytes -= removido
+                self.remocoes += 1
+
+    def tamanho(self):
+        with self.lock:
+            return len(self.itens), self.bytes
+
+
+# Um arquivo por trecho numa pasta compartilhada por todos os workers. A
+# escrita vai para um arquivo temporário e é trocada com os.replace, então
+# quem lê nunca vê um arquivo pela metade. A cada LIMPEZA_A_CADA escritas os
+# arquivos mais antigos (por data de uso) são apagados até caber no limite
+class CacheDisco:
+    nome = "disco"
+    LIMPEZA_A_CADA = 64
+
+    def __init__(self, pasta, limite_bytes):
+        self.pasta = pasta
+        self.limite_bytes = limite_bytes
+        self.escritas = 0
+        self.remocoes = 0
+        self.lock = threading.Lock()
+        os.makedirs(pasta, exist_ok=True)
+
+    def _caminho(self, chave):
+        return os.path.join(self.pasta, chave + ".html")
+
+    def get(self, chave):
+        caminho = self._caminho(chave)
+        try:
+            with open(caminho, encoding="utf-8") as arquivo:
+                valor = arquivo.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(caminho)
+        except OSError:
+            pass
+        return valor
+
+    def set(self, chave, valor):
+        descritor, temporario = tempfile.mkstemp(dir=self.pasta, suffix=".tmp")
+        with os.fdopen(descritor, "w", encoding="utf-8") as arquivo:
+            arquivo.write(valor)
+        os.replace(temporario, self._caminho(chave))
+        with self.lock:
+            self.escritas += 1
+            limpar = self.escritas % self.LIMPEZA_A_CADA == 0
+        if limpar:
+            self.limpar()
+
+    def _arquivos(self):
+        arquivos = []
+        with os.scandir(self.pasta) as entradas:
+            for entrada in entradas:
+                if entrada.name.endswith(".html"):
+                    try:
+                        estado = entrada.stat()
+                    except FileNotFoundError:
+                        continue
+                    arquivos.append((estado.st_mtime, estado.st_size, entrada.path))
+        return arquivos
+
+    def limpar(self):
+        arquivos = sorted(self._arquivos())
+        total = sum(tamanho for _, tamanho, _ in arquivos)
+        for _, tamanho, caminho in arquivos:
+            if total <= self.limite_bytes:
+                break
+            try:
+                os.remove(caminho)
+                self.remocoes += 1
+            except FileNotFoundError:
+                pass
+            total -= tamanho
+
+    def tamanho(self):
+        arquivos = self._arquivos()
+        return len(arquivos), sum(tamanho for _, tamanho, _ in arquivos)
+
+
+# Guarda o backend escolhido e conta acertos/falhas por trecho
+class CacheFragmentos:
+    def __init__(self, backend):
+        self.backend = backend
+        self.acertos = defaultdict(int)
+        self.falhas = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def obter(self, nome, chave, gerar):
+        if self.backend is None:
+            return gerar()
+        valor = self.backend.get(chave)
+        with self.lock:
+            if valor is None:
+                self.falhas[nome] += 1
+            else:
+                self.acertos[nome] += 1
+        if valor is None:
+            valor = gerar()
+            self.backend.set(chave, valor)
+        return valor
+
+    # Linhas no formato do Prometheus, acrescentadas a /metrics
+    def metricas(self):
+        if self.backend is None:
+            return ""
+        backend = self.backend.nome
+        itens, tamanho = self.backend.tamanho()
+        with self.lock:
+            acertos = sorted(self.acertos.items())
+            falhas = sorted(self.falhas.items())
+        linhas = [
+            "# HELP biblioteca_fragmentos_acertos_total Trechos servidos do cache.",
+            "# TYPE biblioteca_fragmentos_acertos_total counter",
+        ]
+        linhas += [f'biblioteca_fragmentos_acertos_total{{backend="{backend}",fragmento="{nome}"}} {total}' for nome, total in acertos]
+        linhas += [
+            "# HELP biblioteca_fragmentos_falhas_total Trechos renderizados por não estarem no cache.",
+            "# TYPE biblioteca_fragmentos_falhas_total counter",
+        ]
+        linhas += [f'biblioteca_fragmentos_falhas_total{{backend="{backend}",fragmento="{nome}"}} {total}' for nome, total in falhas]
+        linhas += [
+            "# HELP biblioteca_fragmentos_remocoes_total Trechos removidos pelo limite de tamanho.",
+            "# TYPE biblioteca_fragmentos_remocoes_total counter",
+            f'biblioteca_fragmentos_remocoes_total{{backend="{backend}"}} {self.backend.remocoes}',
+            "# HELP biblioteca_fragmentos_itens Trechos guardados.",
+            "# TYPE biblioteca_fragmentos_itens gauge",
+            f'biblioteca_fragmentos_itens{{backend="{backend}"}} {itens}',
+            "# HELP biblioteca_fragmentos_bytes Tamanho dos trechos guardados.",
+            "# TYPE biblioteca_fragmentos_bytes gauge",
+            f'biblioteca_fragmentos_bytes{{backend="{backend}"}} {tamanho}',
+        ]
+        return "\n".join(linhas) + "\n"
+
+
+def init_app(app):
+    tipo = app.config["FRAGMENT_CACHE"]
+    limite = app.config["FRAGMENT_CACHE_BYTES"]
+    if tipo == "memoria":
+        backend = CacheMemoria(limite)
+    elif tipo == "disco":
+        pasta = app.config["FRAGMENT_CACHE_DIR"] or os.path.join(app.instance_path, "fragmentos")
+        backend = CacheDisco(pasta, limite)
+    elif tipo in ("", "nenhum"):
+        backend = None
+    else:
+        raise ValueError(f"FRAGMENT_CACHE inválido: {tipo!r} (use memoria, disco ou nenhum)")
+    app.extensions["fragmentos"] = CacheFragmentos(backend)
+
+
+# HTML de um trecho, do cache ou gerado por "gerar()". "grupos" são os
+# grupos de dados (versoes.CHAVES) de que o trecho depende e "partes" o que
+# mais muda o conteúdo (cursor da página, aluno...)
+def fragmento(nome, grupos, partes, gerar):
+    versoes, _ = versao_atual(*grupos)
+    identificacao = repr((current_app.extensions["versao_app"], nome, versoes, partes))
+    chave = hashlib.sha1(identificacao.encode()).hexdigest()
+    return Markup(current_app.extensions["fragmentos"].obter(nome, chave, gerar))
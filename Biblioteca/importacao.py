@@ -0,0 +1,307 @@
+import csv
+import hashlib
+import secrets
+from datetime import date, datetime, timedelta
+from time import perf_counter
+
+from sqlalchemy import bindparam, delete, insert, select, update
+
+from versoes import incrementar_versao
+
+
+COLUNAS_LIVRO = ["tituloLivro", "editora", "anoLivro", "quantidadeLivros", "qtdeLivDisponiveis"]
+# Valor de users.password enquanto o aluno não define a senha; não é um hash
+# válido, então nenhuma senha confere com ele
+SENHA_NAO_DEFINIDA = "!"
+MAXIMO_ERROS = 100
+# Linhas por executemany/commit
+TAMANHO_LOTE = 1000
+
+
+class ResultadoImportacao:
+    def __init__(self, item):
+        self.item = item
+        self.linhas = 0
+        self.inseridos = 0
+        self.somados = 0
+        self.ignorados = 0
+        self.reemitidos = 0
+        self.erros = []
+        self.inicio = perf_counter()
+        self.duracao = 0.0
+
+    @property
+    def invalidas(self):
+        return self.linhas - self.inseridos - self.somados - self.ignorados - self.reemitidos
+
+    @property
+    def linhas_por_segundo(self):
+        return self.linhas / self.duracao if self.duracao else 0.0
+
+    def __str__(self):
+        partes = [f"{self.inseridos} {self.item} novos"]
+        if self.somados:
+            partes.append(f"{self.somados} somados a {self.item} existentes")
+        if self.ignorados:
+            partes.append(f"{self.ignorados} já cadastrados")
+        if self.reemitidos:
+            partes.append(f"{self.reemitidos} ainda sem senha, com link novo")
+        partes.append(f"{self.invalidas} inválidas")
+        return (
+            f"{self.linhas} linhas em {self.duracao:.2f}s ({self.linhas_por_segundo:.0f} linhas/s): "
+            + ", ".join(partes)
+        )
+
+
+# Linhas do CSV numeradas como no arquivo (o cabeçalho é a linha 1). Um
+# arquivo com outra codificação ou CSV malformado interrompe a leitura: o
+# erro vai para o resultado e o que já foi lido continua valendo
+def ler_linhas(leitor, resultado):
+    linhas = iter(leitor)
+    numero = 1
+    while True:
+        try:
+            linha = next(linhas)
+        except StopIteration:
+            return
+        except (UnicodeDecodeError, csv.Error) as erro:
+            resultado.erros.append((numero + 1, f"leitura interrompida, arquivo inválido (use CSV em UTF-8): {erro}"))
+            return
+        numero += 1
+        yield numero, linha
+
+
+def colunas_ausentes(leitor, obrigatorias, resultado):
+    try:
+        colunas = leitor.fieldnames or []
+    except (UnicodeDecodeError, csv.Error) as erro:
+        resultado.erros.append((1, f"arquivo inválido (use CSV em UTF-8): {erro}"))
+        return True
+    faltando = set(obrigatorias) - set(colunas)
+    if faltando:
+        resultado.erros.append((1, "colunas ausentes: " + ", ".join(sorted(faltando))))
+    return bool(faltando)
+
+
+# Converte e valida uma linha do CSV. Devolve a chave do livro
+# (título, editora, ano) e as quantidades, ou levanta ValueError
+def validar_linha(linha):
+    titulo = (linha.get("tituloLivro") or "").strip()
+    editora = (linha.get("editora") or "").strip()
+    if not titulo or not editora:
+        raise ValueError("título e editora são obrigatórios")
+    if len(titulo) > 100 or len(editora) > 100:
+        raise ValueError("título e editora têm no máximo 100 caracteres")
+
+    try:
+        ano = int(linha.get("anoLivro") or "")
+        quantidade = int(linha.get("quantidadeLivros") or "")
+        disponiveis = int(linha.get("qtdeLivDisponiveis") or quantidade)
+    except ValueError:
+        raise ValueError("ano e quantidades devem ser números inteiros")
+    if not 0 < ano <= date.today().year + 1:
+        raise ValueError(f"ano inválido: {ano}")
+    if quantidade < 0 or not 0 <= disponiveis <= quantidade:
+        raise ValueError("quantidades inválidas")
+    return (titulo, editora, ano), quantidade, disponiveis
+
+
+# Importa livros de um CSV (com cabeçalho) lendo uma linha por vez. A cada
+# "tamanho_lote" linhas válidas, os livros que já existem (mesmo título,
+# editora e ano) têm as quantidades somadas e os novos são inseridos, tudo
+# com executemany e um commit por lote, junto com a versão do catálogo
+def importar_livros(db, arquivo, tamanho_lote=TAMANHO_LOTE, delimitador=","):
+    tabela = db.metadata.tables["livros"]
+    resultado = ResultadoImportacao("livros")
+    lote = {}
+
+    def gravar():
+        chaves = list(lote)
+        titulos = {titulo for titulo, _, _ in chaves}
+        existentes = {
+            (linha.tituloLivro, linha.editora, linha.anoLivro): linha.idLivro
+            for linha in db.session.execute(
+                select(tabela.c.idLivro, tabela.c.tituloLivro, tabela.c.editora, tabela.c.anoLivro)
+                .where(tabela.c.tituloLivro.in_(titulos))
+            )
+        }
+
+        somar = []
+        novos = []
+        for chave in chaves:
+            quantidade, disponiveis, linhas = lote[chave]
+            if chave in existentes:
+                somar.append({"id": existentes[chave], "quantidade": quantidade, "disponiveis": disponiveis})
+                resultado.somados += linhas
+            else:
+                titulo, editora, ano = chave
+                novos.append({
+                    "tituloLivro": titulo,
+                    "editora": editora,
+                    "anoLivro": ano,
+                    "quantidadeLivros": quantidade,
+                    "qtdeLivDisponiveis": disponiveis,
+                })
+                resultado.inseridos += linhas
+
+        if somar:
+            db.session.execute(
+                update(tabela)
+                .where(tabela.c.idLivro == bindparam("id"))
+                .values(
+                    quantidadeLivros=tabela.c.quantidadeLivros + bindparam("quantidade"),
+                    qtdeLivDisponiveis=tabela.c.qtdeLivDisponiveis + bindparam("disponiveis"),
+                ),
+                somar,
+            )
+        if novos:
+            db.session.execute(insert(tabela), novos)
+        # Cada lote é confirmado sozinho, então a versão do catálogo sobe no
+        # mesmo commit: se um lote seguinte falhar, as listagens não ficam
+        # respondendo com a versão anterior aos livros já gravados
+        incrementar_versao("livros")
+        db.session.commit()
+        lote.clear()
+
+    leitor = csv.DictReader(arquivo, delimiter=delimitador)
+    if colunas_ausentes(leitor, COLUNAS_LIVRO[:4], resultado):
+        resultado.duracao = perf_counter() - resultado.inicio
+        return resultado
+
+    for numero, linha in ler_linhas(leitor, resultado):
+        resultado.linhas += 1
+        try:
+            chave, quantidade, disponiveis = validar_linha(linha)
+        except ValueError as erro:
+            if len(resultado.erros) < MAXIMO_ERROS:
+                resultado.erros.append((numero, str(erro)))
+            continue
+
+        # Linhas repetidas no mesmo lote viram uma só
+        anterior = lote.get(chave, (0, 0, 0))
+        lote[chave] = (anterior[0] + quantidade, anterior[1] + disponiveis, anterior[2] + 1)
+        if len(lote) >= tamanho_lote:
+            gravar()
+    if lote:
+        gravar()
+
+    resultado.duracao = perf_counter() - resultado.inicio
+    return resultado
+
+
+def hash_token(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def validar_aluno(linha):
+    nome = (linha.get("nome") or "").strip()
+    email = (linha.get("email") or "").strip().lower()
+    if not nome or not email:
+        raise ValueError("nome e email são obrigatórios")
+    if len(nome) > 84 or len(email) > 84 or "@" not in email:
+        raise ValueError("nome ou email inválido")
+    numero = (linha.get("numeroAluno") or "").strip()
+    if numero and not numero.isdigit():
+        raise ValueError("numeroAluno deve ser um número inteiro")
+    return {
+        "name": nome,
+        "email": email,
+        "endereco": (linha.get("endereco") or "").strip()[:100] or None,
+        "telefone": (linha.get("telefone") or "").strip()[:20] or None,
+        "numeroAluno": int(numero) if numero else None,
+    }
+
+
+# Cadastra alunos de uma lista (CSV com cabeçalho) em lotes: usuários, alunos
+# e tokens de ativação entram com executemany e um commit por lote. Nenhum
+# hash de senha é calculado aqui; cada aluno recebe um token de uso único e
+# define a própria senha ao ativar a conta. Emails de contas já ativadas são
+# ignorados; contas ainda sem senha recebem um token novo. Chama
+# "ao_criar(nome, email, token)" para cada conta criada ou reemitida
+def importar_alunos(db, arquivo, tamanho_lote=TAMANHO_LOTE, delimitador=",", validade=timedelta(days=30), ao_criar=None):
+    usuarios = db.metadata.tables["users"]
+    alunos = db.metadata.tables["alunos"]
+    tokens = db.metadata.tables["tokens_ativacao"]
+    resultado = ResultadoImportacao("alunos")
+    lote = {}
+
+    def gravar():
+        nomes = {email: aluno["name"] for email, aluno in lote.items()}
+        ids = {}
+        for email, usuario_id, senha in db.session.execute(
+            select(usuarios.c.email, usuarios.c.id, usuarios.c.password).where(usuarios.c.email.in_(list(lote)))
+        ):
+            del lote[email]
+            if senha == SENHA_NAO_DEFINIDA:
+                # Conta criada por uma importação anterior e ainda não
+                # ativada (por exemplo, quando a importação foi interrompida
+                # antes de entregar os links): recebe um token novo
+                ids[email] = usuario_id
+                resultado.reemitidos += 1
+            else:
+                resultado.ignorados += 1
+
+        if lote:
+            db.session.execute(insert(usuarios), [
+                {"name": aluno["name"], "email": email, "password": SENHA_NAO_DEFINIDA}
+                for email, aluno in lote.items()
+            ])
+            criados = dict(db.session.execute(
+                select(usuarios.c.email, usuarios.c.id).where(usuarios.c.email.in_(list(lote)))
+            ).all())
+            db.session.execute(insert(alunos), [
+                {
+                    "user_id": criados[email],
+                    "endereco": aluno["endereco"],
+                    "telefone": aluno["telefone"],
+                    "numeroAluno": aluno["numeroAluno"],
+                    "qtdeLivros": 0,
+                    "pendencias": False,
+                }
+                for email, aluno in lote.items()
+            ])
+            ids.update(criados)
+        if not ids:
+            return
+
+        # Os tokens anteriores das contas reemitidas deixam de valer
+        db.session.execute(delete(tokens).where(tokens.c.user_id.in_(list(ids.values()))))
+        expira_em = datetime.utcnow() + validade
+        gerados = {email: secrets.token_urlsafe(32) for email in ids}
+        db.session.execute(insert(tokens), [
+            {"user_id": ids[email], "token_hash": hash_token(token), "expira_em": expira_em}
+            for email, token in gerados.items()
+        ])
+        db.session.commit()
+
+        resultado.inseridos += len(lote)
+        if ao_criar is not None:
+            for email, token in gerados.items():
+                ao_criar(nomes[email], email, token)
+        lote.clear()
+
+    leitor = csv.DictReader(arquivo, delimiter=delimitador)
+    if colunas_ausentes(leitor, ("nome", "email"), resultado):
+        resultado.duracao = perf_counter() - resultado.inicio
+        return resultado
+
+    for numero, linha in ler_linhas(leitor, resultado):
+        resultado.linhas += 1
+        try:
+            aluno = validar_aluno(linha)
+        except ValueError as erro:
+            if len(resultado.erros) < MAXIMO_ERROS:
+                resultado.erros.append((numero, str(erro)))
+            continue
+
+        if aluno["email"] in lote:
+            resultado.ignorados += 1
+            continue
+        lote[aluno["email"]] = aluno
+        if len(lote) >= tamanho_lote:
+            gravar()
+    if lote:
+        gravar()
+
+    resultado.duracao = perf_counter() - resultado.inicio
+    return resultado
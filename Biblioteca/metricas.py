@@ -0,0 +1,206 @@
+import json
+import logging
+import threading
+from collections import defaultdict
+from time import perf_counter
+
+from flask import current_app, g, has_request_context, request, request_finished, request_started
+from flask import before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# Limites (em segundos) dos buckets do histograma de latência
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+logger = logging.getLogger("biblioteca.metricas")
+
+
+# Uma linha JSON por requisição na saída de erro, que o flask run e o
+# gunicorn repassam. Sem handler próprio o logger herdaria o nível WARNING
+# da raiz e descartaria as linhas. Não propaga, para não sair duplicada
+# quando a raiz também tem handler
+def _configurar_logger():
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+class EstatisticaEndpoint:
+    def __init__(self):
+        self.requisicoes = defaultdict(int)  # (método, status) -> total
+        self.buckets = [0] * len(BUCKETS_LATENCIA)
+        self.tempo_total = 0.0
+        self.consultas = 0
+        self.tempo_banco = 0.0
+        self.tempo_template = 0.0
+        self.bytes_resposta = 0
+
+    @property
+    def total(self):
+        return sum(self.requisicoes.values())
+
+
+# Instrumentação por requisição: número de comandos SQL, tempo no banco,
+# tempo de renderização de templates, tamanho da resposta e latência,
+# agregados por endpoint. Os números são do processo atual; com vários
+# workers, cada um expõe os seus (o Prometheus soma pelas instâncias).
+# Cada app tem os seus números, em app.extensions["metricas"]
+class MetricasApp:
+    def __init__(self, log_json=False):
+        self.lock = threading.Lock()
+        self.endpoints = defaultdict(EstatisticaEndpoint)
+        self.inicializacao = None
+        self.log_json = log_json
+
+    # Tempo gasto por create_app(), exportado junto com as outras métricas
+    def registrar_inicializacao(self, segundos):
+        self.inicializacao = segundos
+
+    def _inicio_requisicao(self, sender, **extra):
+        g._metricas = {"inicio": perf_counter(), "consultas": 0, "tempo_banco": 0.0, "tempo_template": 0.0}
+
+    def _inicio_template(self, sender, template, context, **extra):
+        dados = g.get("_metricas")
+        if dados is not None:
+            dados.setdefault("templates", []).append(perf_counter())
+
+    def _fim_template(self, sender, template, context, **extra):
+        dados = g.get("_metricas")
+        if dados is not None and dados.get("templates"):
+            dados["tempo_template"] += perf_counter() - dados["templates"].pop()
+
+    def _fim_requisicao(self, sender, response, **extra):
+        dados = g.pop("_metricas", None)
+        if dados is None:
+            return
+
+        duracao = perf_counter() - dados["inicio"]
+        endpoint = request.endpoint or "desconhecido"
+        # Respostas em streaming não têm tamanho conhecido neste ponto
+        tamanho = 0 if response.is_streamed else (response.content_length or 0)
+
+        with self.lock:
+            estatistica = self.endpoints[endpoint]
+            estatistica.requisicoes[(request.method, response.status_code)] += 1
+            for i, limite in enumerate(BUCKETS_LATENCIA):
+                if duracao <= limite:
+                    estatistica.buckets[i] += 1
+            estatistica.tempo_total += duracao
+            estatistica.consultas += dados["consultas"]
+            estatistica.tempo_banco += dados["tempo_banco"]
+            estatistica.tempo_template += dados["tempo_template"]
+            estatistica.bytes_resposta += tamanho
+
+        if self.log_json:
+            logger.info(json.dumps({
+                "endpoint": endpoint,
+                "metodo": request.method,
+                "caminho": request.path,
+                "status": response.status_code,
+                "duracao_ms": round(duracao * 1000, 3),
+                "consultas": dados["consultas"],
+                "tempo_banco_ms": round(dados["tempo_banco"] * 1000, 3),
+                "tempo_template_ms": round(dados["tempo_template"] * 1000, 3),
+                "bytes": tamanho,
+            }))
+
+    # Texto no formato de exposição do Prometheus (versão 0.0.4)
+    def exportar(self):
+        linhas = []
+
+        def metrica(nome, tipo, ajuda):
+            linhas.append(f"# HELP {nome} {ajuda}")
+            linhas.append(f"# TYPE {nome} {tipo}")
+
+        with self.lock:
+            endpoints = sorted(self.endpoints.items())
+
+            metrica("biblioteca_requisicoes_total", "counter", "Requisições atendidas.")
+            for endpoint, estatistica in endpoints:
+                for (metodo, status), total in sorted(estatistica.requisicoes.items()):
+                    linhas.append(
+                        f'biblioteca_requisicoes_total{{endpoint="{endpoint}",metodo="{metodo}",status="{status}"}} {total}'
+                    )
+
+            metrica("biblioteca_requisicao_segundos", "histogram", "Latência das requisições.")
+            for endpoint, estatistica in endpoints:
+                for limite, quantidade in zip(BUCKETS_LATENCIA, estatistica.buckets):
+                    linhas.append(f'biblioteca_requisicao_segundos_bucket{{endpoint="{endpoint}",le="{limite}"}} {quantidade}')
+                linhas.append(f'biblioteca_requisicao_segundos_bucket{{endpoint="{endpoint}",le="+Inf"}} {estatistica.total}')
+                linhas.append(f'biblioteca_requisicao_segundos_sum{{endpoint="{endpoint}"}} {estatistica.tempo_total:.6f}')
+                linhas.append(f'biblioteca_requisicao_segundos_count{{endpoint="{endpoint}"}} {estatistica.total}')
+
+            metrica("biblioteca_consultas_sql_total", "counter", "Comandos SQL executados.")
+            for endpoint, estatistica in endpoints:
+                linhas.append(f'biblioteca_consultas_sql_total{{endpoint="{endpoint}"}} {estatistica.consultas}')
+
+            metrica("biblioteca_banco_segundos_total", "counter", "Tempo gasto no banco de dados.")
+            for endpoint, estatistica in endpoints:
+                linhas.append(f'biblioteca_banco_segundos_total{{endpoint="{endpoint}"}} {estatistica.tempo_banco:.6f}')
+
+            metrica("biblioteca_template_segundos_total", "counter", "Tempo gasto renderizando templates.")
+            for endpoint, estatistica in endpoints:
+                linhas.append(f'biblioteca_template_segundos_total{{endpoint="{endpoint}"}} {estatistica.tempo_template:.6f}')
+
+            metrica("biblioteca_resposta_bytes_total", "counter", "Bytes enviados nas respostas.")
+            for endpoint, estatistica in endpoints:
+                linhas.append(f'biblioteca_resposta_bytes_total{{endpoint="{endpoint}"}} {estatistica.bytes_resposta}')
+
+            if self.inicializacao is not None:
+                metrica("biblioteca_inicializacao_segundos", "gauge", "Tempo para criar o app.")
+                linhas.append(f"biblioteca_inicializacao_segundos {self.inicializacao:.6f}")
+
+        return "\n".join(linhas) + "\n"
+
+
+# Extensão compartilhada entre os apps: cria as métricas de cada app e liga
+# os sinais do app a elas
+class Metricas:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("METRICS_LOG_JSON", False)
+        metricas = MetricasApp(app.config["METRICS_LOG_JSON"])
+        app.extensions["metricas"] = metricas
+        if metricas.log_json:
+            _configurar_logger()
+
+        request_started.connect(metricas._inicio_requisicao, app)
+        request_finished.connect(metricas._fim_requisicao, app)
+        before_render_template.connect(metricas._inicio_template, app)
+        template_rendered.connect(metricas._fim_template, app)
+
+        # Escutar na classe Engine cobre qualquer engine criada pelo app
+        if not event.contains(Engine, "before_cursor_execute", _antes_do_sql):
+            event.listen(Engine, "before_cursor_execute", _antes_do_sql)
+            event.listen(Engine, "after_cursor_execute", _depois_do_sql)
+
+    def registrar_inicializacao(self, app, segundos):
+        app.extensions["metricas"].registrar_inicializacao(segundos)
+
+    # Métricas do app atual
+    def exportar(self):
+        return current_app.extensions["metricas"].exportar()
+
+
+def _antes_do_sql(conexao, cursor, comando, parametros, contexto, executemany):
+    conexao.info.setdefault("_metricas_inicio", []).append(perf_counter())
+
+
+def _depois_do_sql(conexao, cursor, comando, parametros, contexto, executemany):
+    inicios = conexao.info.get("_metricas_inicio")
+    if not inicios:
+        return
+    inicio = inicios.pop()
+    if not has_request_context():
+        return
+    dados = g.get("_metricas")
+    if dados is not None:
+        dados["consultas"] += 1
+        dados["tempo_banco"] += perf_counter() - inicio
@@ -0,0 +1,48 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateTable
+
+
+# Migrações de bancos criados por versões anteriores do app. Cada uma verifica
+# se é necessária e pode ser executada quantas vezes for preciso
+
+
+# As datas de livros_alugados eram VARCHAR e a tabela não tinha AUTOINCREMENT
+# (o SQLite reaproveitava o id do último aluguel devolvido). No SQLite as duas
+# coisas só mudam recriando a tabela: cria a nova pelo modelo, copia os dados
+# normalizando as datas para AAAA-MM-DD (aceita também DD/MM/AAAA), troca as
+# tabelas e deixa os índices para inicializar_banco()
+def migrar_livros_alugados(db):
+    engine = db.engine
+    if engine.dialect.name != "sqlite" or not inspect(engine).has_table("livros_alugados"):
+        return False
+
+    colunas = {coluna["name"]: coluna for coluna in inspect(engine).get_columns("livros_alugados")}
+    with engine.connect() as conexao:
+        ddl_atual = conexao.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'livros_alugados'")
+        ).scalar()
+    if "DATE" in str(colunas["dataAluguel"]["type"]).upper() and "AUTOINCREMENT" in ddl_atual.upper():
+        return False
+
+    # DDL atual do modelo, só com o nome trocado
+    ddl = str(CreateTable(db.metadata.tables["livros_alugados"]).compile(dialect=engine.dialect))
+    ddl = ddl.replace("CREATE TABLE livros_alugados", "CREATE TABLE livros_alugados_nova", 1)
+
+    def normalizar(nome):
+        coluna = f'"{nome}"'
+        return (
+            f"CASE WHEN {coluna} LIKE '__/__/____' "
+            f"THEN substr({coluna}, 7, 4) || '-' || substr({coluna}, 4, 2) || '-' || substr({coluna}, 1, 2) "
+            f"ELSE date({coluna}) END"
+        )
+
+    with engine.begin() as conexao:
+        conexao.execute(text(ddl))
+        conexao.execute(text(
+            'INSERT INTO livros_alugados_nova (id, aluno_id, livro_id, "dataAluguel", "dataDevolucao") '
+            f'SELECT id, aluno_id, livro_id, {normalizar("dataAluguel")}, {normalizar("dataDevolucao")} '
+            'FROM livros_alugados'
+        ))
+        conexao.execute(text("DROP TABLE livros_alugados"))
+        conexao.execute(text("ALTER TABLE livros_alugados_nova RENAME TO livros_alugados"))
+    return True
@@ -0,0 +1,100 @@
+from flask_login import UserMixin
+
+from extensions import db
+
+
+class Livro(db.Model):
+    __tablename__ = 'livros'
+    idLivro = db.Column(db.Integer, primary_key=True)
+    tituloLivro = db.Column(db.String(100), nullable=False)
+    editora = db.Column(db.String(100), nullable=False)
+    anoLivro = db.Column(db.Integer, nullable=False)
+    quantidadeLivros = db.Column(db.Integer, nullable=False)
+    qtdeLivDisponiveis = db.Column(db.Integer, nullable=False)
+
+class LivrosAlugados(db.Model):
+    __tablename__ = "livros_alugados"
+    # Sem AUTOINCREMENT o SQLite reaproveita o id do último aluguel apagado
+    # (devolvido), e um id lido antes da devolução poderia apontar para outro aluguel
+    __table_args__ = {"sqlite_autoincrement": True}
+    id = db.Column(db.Integer, primary_key=True)
+    aluno_id = db.Column(db.Integer, db.ForeignKey('alunos.id'), index=True)
+    livro_id = db.Column(db.Integer, db.ForeignKey('livros.idLivro'), index=True)
+    dataAluguel = db.Column(db.Date, nullable=False, index=True)
+    dataDevolucao = db.Column(db.Date, nullable=True)
+    
+
+class User(db.Model, UserMixin):
+    __tablename__ = "users"
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(84), nullable=False)
+    email = db.Column(db.String(84), nullable=False, unique=True)
+    password = db.Column(db.String(255), nullable=False)
+    # Aluno.user vem no mesmo SELECT do aluno (JOIN), evitando uma consulta por aluno nas listagens
+    aluno = db.relationship('Aluno', uselist=False, backref=db.backref('user', lazy='joined'), cascade='all, delete-orphan')
+    funcionario = db.relationship('Funcionario', uselist=False, backref='user', cascade='all, delete-orphan')
+
+    def __str__(self):
+        return self.name
+
+class Aluno(db.Model):
+    __tablename__ = "alunos"
+    id = db.Column(db.Integer, primary_key=True)
+    endereco = db.Column(db.String(100))
+    telefone = db.Column(db.String(20))
+    numeroAluno = db.Column(db.Integer)
+    qtdeLivros = db.Column(db.Integer)
+    pendencias = db.Column(db.Boolean)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
+
+class Funcionario(db.Model):
+    __tablename__ = "funcionarios"
+    id = db.Column(db.Integer, primary_key=True)
+    numeroFuncionario = db.Column(db.Integer)
+    nomeFuncionario = db.Column(db.String(100))
+    emailFuncionario = db.Column(db.String(100))
+    # Índice para o JOIN de User.funcionario, feito a cada login e a cada
+    # carga do usuário
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
+
+# Token de uso único para o aluno cadastrado por lista definir a senha.
+# Só o hash SHA-256 do token fica no banco
+class TokenAtivacao(db.Model):
+    __tablename__ = "tokens_ativacao"
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    token_hash = db.Column(db.String(64), nullable=False, unique=True)
+    expira_em = db.Column(db.DateTime, nullable=False)
+
+# Totais diários de circulação, atualizados na mesma transação do aluguel e
+# da devolução. Sem chave estrangeira: o histórico continua valendo mesmo
+# depois que o livro é excluído do catálogo
+class CirculacaoLivro(db.Model):
+    __tablename__ = "circulacao_diaria_livros"
+    dia = db.Column(db.Date, primary_key=True)
+    livro_id = db.Column(db.Integer, primary_key=True)
+    emprestimos = db.Column(db.Integer, nullable=False, default=0)
+    devolucoes = db.Column(db.Integer, nullable=False, default=0)
+
+class CirculacaoAluno(db.Model):
+    __tablename__ = "circulacao_diaria_alunos"
+    dia = db.Column(db.Date, primary_key=True)
+    aluno_id = db.Column(db.Integer, primary_key=True)
+    emprestimos = db.Column(db.Integer, nullable=False, default=0)
+    devolucoes = db.Column(db.Integer, nullable=False, default=0)
+
+# Versão dos dados exibidos nas listagens, incrementada na mesma transação
+# de cada escrita. Uma linha por grupo ("livros", "alugueis")
+class VersaoDados(db.Model):
+    __tablename__ = "versao_dados"
+    chave = db.Column(db.String(30), primary_key=True)
+    versao = db.Column(db.Integer, nullable=False, default=0)
+    atualizado_em = db.Column(db.DateTime, nullable=False)
+
+# Índices sem diferenciar maiúsculas para as buscas por prefixo das sugestões
+# (o LIKE do SQLite só usa índice quando ele tem collation NOCASE)
+db.Index("ix_livros_titulo_nocase", Livro.tituloLivro.collate("NOCASE")).ddl_if(dialect="sqlite")
+db.Index("ix_users_name_nocase", User.name.collate("NOCASE")).ddl_if(dialect="sqlite")
+# Busca de livros repetidos na importação em lote
+db.Index("ix_livros_titulo_editora_ano", Livro.tituloLivro, Livro.editora, Livro.anoLivro)
+
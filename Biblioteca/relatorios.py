@@ -0,0 +1,168 @@
+import csv
+import hmac
+import io
+import json
+from datetime import datetime
+
+from flask import Blueprint, Response, current_app, flash, redirect, render_template, request, stream_with_context, url_for
+from flask_login import current_user, login_required
+from sqlalchemy import insert
+
+from auth import eh_funcionario
+from circulacao import consulta_alugueis
+from extensions import db, metricas
+from models import Aluno, CirculacaoAluno, CirculacaoLivro, Livro, LivrosAlugados, User
+
+
+bp = Blueprint("relatorios", __name__, cli_group=None)
+
+# Totais, mais alugados e evolução diária de um período, lidos dos totais
+# diários (o custo depende do número de dias, não do número de aluguéis)
+def resumo_circulacao(data_inicial, data_final, limite=10):
+    no_periodo = CirculacaoLivro.dia.between(data_inicial, data_final)
+    emprestimos = db.func.sum(CirculacaoLivro.emprestimos)
+    devolucoes = db.func.sum(CirculacaoLivro.devolucoes)
+
+    dias = db.session.query(CirculacaoLivro.dia, emprestimos.label("emprestimos"), devolucoes.label("devolucoes")).filter(
+        no_periodo
+    ).group_by(CirculacaoLivro.dia).order_by(CirculacaoLivro.dia).all()
+
+    total_livro = emprestimos.label("emprestimos")
+    livros = db.session.query(Livro.tituloLivro, total_livro).join(
+        Livro, Livro.idLivro == CirculacaoLivro.livro_id
+    ).filter(no_periodo).group_by(CirculacaoLivro.livro_id, Livro.tituloLivro).order_by(
+        total_livro.desc()
+    ).limit(limite).all()
+
+    total_aluno = db.func.sum(CirculacaoAluno.emprestimos).label("emprestimos")
+    alunos = db.session.query(User.name, total_aluno).select_from(CirculacaoAluno).join(
+        Aluno, Aluno.id == CirculacaoAluno.aluno_id
+    ).join(User, User.id == Aluno.user_id).filter(
+        CirculacaoAluno.dia.between(data_inicial, data_final)
+    ).group_by(CirculacaoAluno.aluno_id, User.name).order_by(total_aluno.desc()).limit(limite).all()
+
+    return {
+        "emprestimos": sum(dia.emprestimos for dia in dias),
+        "devolucoes": sum(dia.devolucoes for dia in dias),
+        "maximo_dia": max((max(dia.emprestimos, dia.devolucoes) for dia in dias), default=0),
+        "dias": dias,
+        "livros": livros,
+        "alunos": alunos,
+    }
+
+# Rota para o relatório
+@bp.route("/relatorio", methods=["GET"])
+@login_required
+def gerar_relatorio():
+    # O relatório e as exportações trazem todos os aluguéis, com o nome dos alunos
+    if not eh_funcionario():
+        flash("Acesso negado. Somente funcionários podem ver o relatório.")
+        return redirect(url_for("auth.login"))
+
+    data_inicial = request.args.get("data_inicial")
+    data_final = request.args.get("data_final")
+    formato = request.args.get("formato", "html")
+
+    movimentacoes = []
+    resumo = None
+    if data_inicial and data_final:
+        # Converter as strings de data para objetos date
+        try:
+            data_inicial = datetime.strptime(data_inicial, "%Y-%m-%d").date()
+            data_final = datetime.strptime(data_final, "%Y-%m-%d").date()
+        except ValueError:
+            flash("Datas inválidas.")
+        else:
+            # Faixa no índice de dataAluguel, com as duas datas incluídas
+            consulta = consulta_alugueis().filter(
+                LivrosAlugados.dataAluguel.between(data_inicial, data_final)
+            ).order_by(LivrosAlugados.dataAluguel, LivrosAlugados.id)
+            if formato in FORMATOS_EXPORTACAO:
+                return exportar_movimentacoes(consulta, formato, data_inicial, data_final)
+            movimentacoes = consulta.all()
+            resumo = resumo_circulacao(data_inicial, data_final)
+    return render_template("relatorio.html", movimentacoes=movimentacoes, resumo=resumo)
+
+FORMATOS_EXPORTACAO = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson; charset=utf-8",
+}
+COLUNAS_EXPORTACAO = ["id", "aluno", "livro", "dataAluguel", "dataDevolucao"]
+TAMANHO_LOTE_EXPORTACAO = 1000
+
+# Exportação em streaming: as linhas são lidas do cursor em lotes (yield_per)
+# e enviadas conforme ficam prontas, então a memória não cresce com o
+# tamanho do período e o cabeçalho sai antes da primeira consulta terminar
+def exportar_movimentacoes(consulta, formato, data_inicial, data_final):
+    def linhas():
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+
+        def esvaziar():
+            conteudo = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            return conteudo
+
+        if formato == "csv":
+            escritor.writerow(COLUNAS_EXPORTACAO)
+            yield esvaziar()
+
+        for n, movimentacao in enumerate(consulta.yield_per(TAMANHO_LOTE_EXPORTACAO), 1):
+            valores = [
+                movimentacao.id,
+                movimentacao.nomeAluno,
+                movimentacao.tituloLivro,
+                movimentacao.dataAluguel.isoformat(),
+                movimentacao.dataDevolucao.isoformat() if movimentacao.dataDevolucao else None,
+            ]
+            if formato == "csv":
+                escritor.writerow(valores)
+            else:
+                buffer.write(json.dumps(dict(zip(COLUNAS_EXPORTACAO, valores)), ensure_ascii=False) + "\n")
+            if n % TAMANHO_LOTE_EXPORTACAO == 0:
+                yield esvaziar()
+        yield esvaziar()
+
+    nome_arquivo = f"movimentacoes_{data_inicial.isoformat()}_{data_final.isoformat()}.{formato}"
+    return Response(
+        stream_with_context(linhas()),
+        content_type=FORMATOS_EXPORTACAO[formato],
+        headers={"Content-Disposition": f'attachment; filename="{nome_arquivo}"'},
+    )
+
+# Preenche os totais diários que faltam a partir dos aluguéis em aberto (por
+# exemplo, aluguéis feitos antes de os totais existirem). Devoluções apagam o
+# aluguel, então o histórico só existe nos próprios totais: os pares
+# (dia, livro) e (dia, aluno) que já têm totais não são alterados
+@bp.cli.command("reconstruir-circulacao")
+def reconstruir_circulacao():
+    for modelo, coluna in ((CirculacaoLivro, LivrosAlugados.livro_id), (CirculacaoAluno, LivrosAlugados.aluno_id)):
+        chave = getattr(modelo, coluna.key)
+        existente = db.select(modelo.dia).where(modelo.dia == LivrosAlugados.dataAluguel, chave == coluna).exists()
+        inseridos = db.session.execute(
+            insert(modelo).from_select(
+                ["dia", coluna.key, "emprestimos", "devolucoes"],
+                db.select(LivrosAlugados.dataAluguel, coluna, db.func.count(), 0)
+                .where(coluna.is_not(None), ~existente)
+                .group_by(LivrosAlugados.dataAluguel, coluna),
+            )
+        ).rowcount
+        print(f"{inseridos} totais diários por {coluna.key.removesuffix('_id')} preenchidos.")
+    db.session.commit()
+
+# Métricas por endpoint no formato do Prometheus. Aceita o token configurado
+# ou um funcionário logado
+@bp.route("/metrics")
+def exportar_metricas():
+    token = current_app.config["METRICS_TOKEN"]
+    autorizacao = request.headers.get("Authorization", "")
+    autorizado = bool(token) and hmac.compare_digest(autorizacao, f"Bearer {token}")
+    if not autorizado:
+        if not current_user.is_authenticated:
+            return Response("Não autorizado.\n", status=401, mimetype="text/plain")
+        if not eh_funcionario():
+            return Response("Acesso negado.\n", status=403, mimetype="text/plain")
+    texto = metricas.exportar() + current_app.extensions["fragmentos"].metricas()
+    return Response(texto, content_type="text/plain; version=0.0.4; charset=utf-8")
+
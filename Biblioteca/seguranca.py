@@ -0,0 +1,122 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as TempoEsgotado
+from time import monotonic
+
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HashIndisponivel(Exception):
+    pass
+
+
+# Gera e confere hashes de senha num pool limitado de threads. Os hashes são
+# lentos de propósito; com o pool, no máximo HASH_WORKERS deles rodam ao
+# mesmo tempo e o excesso espera até HASH_TIMEOUT segundos por uma vaga,
+# em vez de ocupar todas as threads que atendem requisições. Cada app tem o
+# seu pool, em app.extensions["hash_senhas"]
+class PoolHash:
+    def __init__(self, metodo, workers, timeout):
+        self.metodo = metodo
+        # O Werkzeug completa os métodos abreviados ("scrypt" vira
+        # "scrypt:32768:8:1"); o prefixo de um hash gerado agora é o que os
+        # hashes atualizados têm
+        self.prefixo = generate_password_hash("", metodo).split("$", 1)[0]
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hash")
+        # Limita também a fila: trabalhos esperando + rodando
+        self.vagas = threading.BoundedSemaphore(workers * 4)
+
+    def _executar(self, funcao, *args):
+        if not self.vagas.acquire(timeout=self.timeout):
+            raise HashIndisponivel()
+        try:
+            trabalho = self.executor.submit(funcao, *args)
+        except BaseException:
+            self.vagas.release()
+            raise
+        # A vaga só volta quando o trabalho termina ou é cancelado: um hash
+        # que já começou continua rodando depois do tempo esgotado e segue
+        # contando no limite
+        trabalho.add_done_callback(lambda _: self.vagas.release())
+        try:
+            return trabalho.result(timeout=self.timeout)
+        except TempoEsgotado:
+            trabalho.cancel()
+            raise HashIndisponivel()
+
+    def gerar(self, senha):
+        return self._executar(generate_password_hash, senha, self.metodo)
+
+    def verificar(self, hash_senha, senha):
+        return self._executar(check_password_hash, hash_senha, senha)
+
+    # Hashes gerados com outro método ou custo são refeitos no próximo login
+    def precisa_atualizar(self, hash_senha):
+        return hash_senha.split("$", 1)[0] != self.prefixo
+
+
+# Extensão compartilhada entre os apps: só cria o pool de cada app e repassa
+# as chamadas para o pool do app atual
+class HashSenhas:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("PASSWORD_HASH_METHOD", "pbkdf2:sha256:600000")
+        app.config.setdefault("HASH_WORKERS", 2)
+        app.config.setdefault("HASH_TIMEOUT", 10)
+        app.extensions["hash_senhas"] = PoolHash(
+            app.config["PASSWORD_HASH_METHOD"], app.config["HASH_WORKERS"], app.config["HASH_TIMEOUT"]
+        )
+
+    @staticmethod
+    def _pool():
+        return current_app.extensions["hash_senhas"]
+
+    def gerar(self, senha):
+        return self._pool().gerar(senha)
+
+    def verificar(self, hash_senha, senha):
+        return self._pool().verificar(hash_senha, senha)
+
+    def precisa_atualizar(self, hash_senha):
+        return self._pool().precisa_atualizar(hash_senha)
+
+
+# Limite de requisições por chave (IP, email) com balde de fichas: cada chave
+# tem até "capacidade" fichas, repostas continuamente ao longo de "periodo"
+# segundos, e cada tentativa gasta uma
+class LimitadorTaxa:
+    def __init__(self, capacidade, periodo, maximo_chaves=10000):
+        self.capacidade = capacidade
+        self.taxa = capacidade / periodo
+        self.maximo_chaves = maximo_chaves
+        self.baldes = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def de_texto(cls, limite):
+        # "10/60" -> 10 tentativas a cada 60 segundos
+        capacidade, periodo = limite.split("/")
+        return cls(int(capacidade), float(periodo))
+
+    def permitir(self, chave):
+        agora = monotonic()
+        with self.lock:
+            fichas, ultima = self.baldes.get(chave, (self.capacidade, agora))
+            fichas = min(self.capacidade, fichas + (agora - ultima) * self.taxa)
+            permitido = fichas >= 1
+            if permitido:
+                fichas -= 1
+            self.baldes[chave] = (fichas, agora)
+            if len(self.baldes) > self.maximo_chaves:
+                self._limpar(agora)
+            return permitido
+
+    # Remove os baldes que já voltaram a ficar cheios
+    def _limpar(self, agora):
+        for chave, (fichas, ultima) in list(self.baldes.items()):
+            if fichas + (agora - ultima) * self.taxa >= self.capacidade:
+                del self.baldes[chave]
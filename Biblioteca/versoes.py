@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+from functools import wraps
+
+from flask import current_app, has_request_context, make_response, request
+from flask_login import current_user
+from sqlalchemy import select, update
+from werkzeug.http import is_resource_modified
+
+from extensions import db
+from models import VersaoDados
+
+
+# Grupos de dados com versão própria. "livros" muda com o catálogo e com a
+# disponibilidade; "alugueis" com os aluguéis em aberto
+CHAVES = ("livros", "alugueis")
+
+
+def init_app(app):
+    app.extensions["versao_app"] = _versao_app(app)
+
+
+# Identifica templates e arquivos estáticos do deploy atual: uma página em
+# cache não vale depois que eles mudam, mesmo sem mudança nos dados
+def _versao_app(app):
+    resumo = hashlib.sha1()
+    pasta = os.path.join(app.root_path, app.template_folder)
+    for raiz, pastas, arquivos in os.walk(pasta):
+        pastas.sort()
+        for nome in sorted(arquivos):
+            with open(os.path.join(raiz, nome), "rb") as arquivo:
+                resumo.update(nome.encode() + arquivo.read())
+    resumo.update(json.dumps(app.extensions.get("assets"), sort_keys=True).encode())
+    return resumo.hexdigest()[:16]
+
+
+def garantir_versoes():
+    existentes = set(db.session.scalars(select(VersaoDados.chave)))
+    for chave in CHAVES:
+        if chave not in existentes:
+            db.session.add(VersaoDados(chave=chave, versao=0, atualizado_em=datetime.utcnow().replace(microsecond=0)))
+    db.session.commit()
+
+
+# Incrementa a versão dos grupos dentro da transação corrente; o commit é
+# de quem chamou, junto com a escrita que mudou os dados
+def incrementar_versao(*chaves):
+    agora = datetime.utcnow().replace(microsecond=0)
+    atualizadas = db.session.execute(
+        update(VersaoDados)
+        .where(VersaoDados.chave.in_(chaves))
+        .values(versao=VersaoDados.versao + 1, atualizado_em=agora)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if atualizadas < len(chaves):
+        existentes = set(db.session.scalars(select(VersaoDados.chave).where(VersaoDados.chave.in_(chaves))))
+        for chave in set(chaves) - existentes:
+            db.session.add(VersaoDados(chave=chave, versao=1, atualizado_em=agora))
+
+
+# Versões dos grupos e a data da última mudança entre eles, numa consulta.
+# Dentro de uma requisição o resultado é reaproveitado (a ETag e o cache de
+# trechos usam as mesmas versões)
+def versao_atual(*chaves):
+    # Guardado no environ, que é sempre da requisição atual (g pode ser
+    # compartilhado quando um comando do CLI faz várias requisições)
+    lidas = request.environ.setdefault("biblioteca.versoes", {}) if has_request_context() else {}
+    if chaves not in lidas:
+        lidas[chaves] = _ler_versoes(chaves)
+    return lidas[chaves]
+
+
+def _ler_versoes(chaves):
+    linhas = db.session.execute(
+        select(VersaoDados.chave, VersaoDados.versao, VersaoDados.atualizado_em).where(VersaoDados.chave.in_(chaves))
+    ).all()
+    versoes = {linha.chave: linha.versao for linha in linhas}
+    atualizado_em = max((linha.atualizado_em for linha in linhas), default=None)
+    return tuple(versoes.get(chave, 0) for chave in chaves), atualizado_em
+
+
+# GET condicional para listagens: a ETag sai da versão dos grupos, do
+# usuário e da URL, então um If-None-Match que confere recebe 304 sem que a
+# view (e as consultas da listagem) rode
+def condicional(*chaves):
+    def decorador(view):
+        @wraps(view)
+        def envolvida(*args, **kwargs):
+            if request.method != "GET":
+                return view(*args, **kwargs)
+
+            versoes, atualizado_em = versao_atual(*chaves)
+            identificacao = "|".join([
+                current_app.extensions["versao_app"],
+                ",".join(map(str, versoes)),
+                current_user.get_id() or "",
+                request.full_path,
+            ])
+            etag = hashlib.sha1(identificacao.encode()).hexdigest()[:20]
+
+            if not is_resource_modified(request.environ, etag, last_modified=atualizado_em):
+                resposta = current_app.response_class(status=304)
+            else:
+                resposta = make_response(view(*args, **kwargs))
+                if resposta.status_code != 200:
+                    return resposta
+            resposta.set_etag(etag, weak=True)
+            if atualizado_em is not None:
+                resposta.last_modified = atualizado_em
+            # Só o navegador do usuário guarda, e sempre revalida
+            resposta.cache_control.private = True
+            resposta.cache_control.no_cache = True
+            return resposta
+        return envolvida
+    return decorador